@@ -4,7 +4,6 @@
 # Maintainer: Yuxing Peng, Trung Nguyen
 
 import os
-import yaml
 from . import utils
 
 # SKYWAYROOT is the path to the on-premises folders (not the skyway source code folder)
@@ -29,8 +28,8 @@ def load_config(cfg_name):
     if not os.path.isfile(cfg_file):
         raise Exception(f'Configuration file {cfg_name} cannot be found.')
     
-    with open(cfg_file, 'r') as f:
-        return yaml.load(f.read(), Loader=yaml.FullLoader)
+    # parsed once, then served from the compiled copy until the file changes
+    return utils.load_yaml(cfg_file)
 
 # load the configuration from $SKYWAYROOT/etc/skyway.yaml into cfg, a dictionary
 cfg = load_config('skyway')
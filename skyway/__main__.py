@@ -0,0 +1,8 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+from .cli import main
+
+main()
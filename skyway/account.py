@@ -3,28 +3,101 @@
 
 # Maintainer: Yuxing Peng, Trung Nguyen
 
+import copy
 import os
+import threading
 import yaml
 from . import cfg
 from . import utils
 
+class AccountRegistry():
+    '''
+    index of the accounts under $SKYWAYROOT/etc/accounts: account name -> path, vendor and parsed configuration,
+    the folder is rescanned only when its modification time changes, and each account file is parsed
+    on first use (and again only if the file itself changes)
+    '''
+    def __init__(self, folder):
+        self.folder = folder
+        self.mtime = None
+        # account name -> {'path': path to the .yaml file, 'key': (size, mtime) when parsed, 'config': parsed file}
+        self.index = {}
+        # the registry is shared by the threads of a process (e.g. the GUI and skywayd)
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        with self.lock:
+            mtime = os.stat(self.folder).st_mtime_ns
+            if mtime == self.mtime:
+                return
+            index = {}
+            for f in os.listdir(self.folder):
+                if f.endswith('.yaml'):
+                    name = f.split('.')[0]
+                    cfg_file = os.path.join(self.folder, f)
+                    entry = self.index.get(name)
+                    if entry is None or entry['path'] != cfg_file:
+                        entry = {'path': cfg_file, 'key': None, 'config': None}
+                    index[name] = entry
+            self.index = index
+            self.mtime = mtime
+
+    def names(self):
+        self.refresh()
+        return sorted(self.index)
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def path(self, name):
+        self.refresh()
+        if name not in self.index:
+            raise Exception(f'Account {name} does not exist.')
+        return self.index[name]['path']
+
+    def _config(self, name):
+        # the parsed configuration kept in the index, shared by all the callers
+        self.refresh()
+        with self.lock:
+            entry = self.index.get(name)
+            if entry is None:
+                raise Exception(f'Account {name} does not exist.')
+            st = os.stat(entry['path'])
+            key = (st.st_size, st.st_mtime_ns)
+            if entry['key'] != key:
+                entry['config'] = utils.load_yaml(entry['path'])
+                entry['key'] = key
+            return entry['config']
+
+    def config(self, name):
+        '''
+        the parsed configuration of an account, a copy that the caller may modify
+        '''
+        return copy.deepcopy(self._config(name))
+
+    def vendor(self, name):
+        '''
+        the cloud field of the account, e.g. aws, gcp, azure, oci or slurm
+        '''
+        return self._config(name)['cloud']
+
+    def load_all(self):
+        '''
+        parse all the accounts at once, return a dictionary account name -> configuration
+        '''
+        return {name: self.config(name) for name in self.names()}
+
+registry = AccountRegistry(cfg['paths']['etc'] + '/accounts')
+
 # return the list of accounts, that is the list of the .yaml files under $SKYWAYROOT/accounts
 def accounts():
-    acct_list = []
-    for f in os.listdir(cfg['paths']['etc'] + '/accounts'):
-        if f.endswith('.yaml'):
-           acct_list.append(f.split('.')[0])
-    return sorted(acct_list)
+    return registry.names()
 
 def load_cfg(account):
-    if account not in accounts():
-        raise Exception(f'Account {account} does not exist.')
-
-    cfg_file = f"{cfg['paths']['etc']}/accounts/{account}.yaml"
-    with open(cfg_file, "r") as f:
-        acct_cfg = yaml.load(f, Loader=yaml.FullLoader)
-    
-    return acct_cfg
+    return registry.config(account)
 
 def list():
     print("\nAccounts:\n\n" + yaml.dump(accounts()))
@@ -35,8 +108,8 @@ def show(acct):
 # update pluggable authenication modules (PAM)
 def update_pam():
     users = []
-    for acct in accounts():
-        users += load_cfg(acct)['users']
+    for acct_cfg in registry.load_all().values():
+        users += acct_cfg['users']
 
     nerror = 0
     for u in set(users):
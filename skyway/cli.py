@@ -0,0 +1,313 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Multi-command entry point: run the skyway_* operations as subcommands of one process,
+
+    python -m skyway alloc -A rcc-aws -J my-run --constraint t1 -t 01:00:00
+    python -m skyway run-commands workflow.txt
+    python -m skyway shell
+
+In run-commands and shell mode all the operations share one Session, which keeps
+one provider object per account, the listing of each account until an allocation or a cancellation
+changes it, the connection information of each job and one SSH connection per node (OpenSSH ControlMaster).
+Account and job name carry over from one command to the next when they are not given.
+"""
+
+import argparse
+import csv
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from . import cloud
+from . import utils
+
+class Session():
+    '''
+    state shared by the commands of one skyway process
+    '''
+    def __init__(self):
+        self.providers = {}
+        self.listings = {}
+        self.node_infos = {}
+        self.logins = set()
+        self.account_name = ""
+        self.jobname = ""
+
+    def vendor_name(self, account_name, provider=""):
+        if provider != "":
+            return provider.lower()
+        # same inference as the skyway_* commands, then the cloud field of the account
+        for vendor in ['aws', 'gcp', 'azure', 'oci']:
+            if vendor in account_name:
+                return vendor
+        if 'midway3' in account_name or 'rcc-staff' in account_name:
+            return "rcc-midway3"
+        from . import account
+        return account.registry.vendor(account_name)
+
+    def provider(self, account_name, provider=""):
+        if account_name not in self.providers:
+            vendor_name = self.vendor_name(account_name, provider)
+            self.providers[account_name] = (vendor_name, cloud.connect(account_name, vendor_name))
+        return self.providers[account_name]
+
+    def node_table(self, account_name):
+        if account_name not in self.listings:
+            _, provider = self.provider(account_name)
+            self.listings[account_name] = provider.node_table()
+        return self.listings[account_name]
+
+    def invalidate(self, account_name):
+        '''
+        forget what an allocation or a cancellation may have changed
+        '''
+        self.listings.pop(account_name, None)
+        for key in [key for key in self.node_infos if key[0] == account_name]:
+            del self.node_infos[key]
+
+    def node_info(self, account_name, jobname):
+        '''
+        private key and login (user@host) of the node running a job
+        '''
+        key = (account_name, jobname)
+        if key not in self.node_infos:
+            vendor_name, provider = self.provider(account_name)
+            records = [record for record in self.node_table(account_name)
+                       if record.name == jobname and str(record.state).lower() in ['running', 'r']]
+            if "midway3" in vendor_name:
+                # for on-premises like midway3 instanceID is the host ip (which happens to be the node name)
+                instanceID = records[0].host if records else provider.get_host_ip(jobname)
+            else:
+                instanceID = records[0].id if records else provider.get_instance_ID(jobname)
+            if not instanceID:
+                raise Exception(f'Job {jobname} is not running under {account_name}.')
+            node_info = provider.get_node_connection_info(instanceID)
+            if node_info is None:
+                raise Exception(f'Cloud vendor {vendor_name} does not support connecting to nodes.')
+            self.node_infos[key] = node_info
+        return self.node_infos[key]
+
+    def ssh_opts(self, node_info):
+        opts = "-o StrictHostKeyChecking=accept-new " + utils.ssh_mux_opts()
+        if node_info['private_key'] != "":
+            opts = f"-i {node_info['private_key']} " + opts
+        self.logins.add((node_info['login'], opts))
+        return opts
+
+    def close(self):
+        # stop the SSH master connections opened by this session
+        for login, opts in self.logins:
+            subprocess.run(f"ssh {opts} -O exit {login}", shell=True, capture_output=True)
+        self.logins.clear()
+
+def write_rows(rows, headers, format, file=None):
+    '''
+    write the rows of a listing one line each (format ndjson or csv) as they come, so that memory does not grow
+    with the number of rows; times and other non-JSON values are written as strings
+    '''
+    if file is None:
+        file = sys.stdout
+    if format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(headers)
+    for row in rows:
+        if format == 'ndjson':
+            file.write(json.dumps(dict(zip(headers, row)), default=str) + '\n')
+        else:
+            writer.writerow(row)
+        file.flush()
+
+def resolve(session, args):
+    '''
+    fill in the account and job name from the previous command of the session
+    '''
+    if getattr(args, 'account', None) is not None:
+        if args.account == "":
+            args.account = session.account_name
+        if args.account == "":
+            raise Exception('Account name is not given (-A).')
+        session.account_name = args.account
+    if getattr(args, 'jobname', None) is not None:
+        if args.jobname == "":
+            args.jobname = session.jobname
+        session.jobname = args.jobname
+
+def do_list(session, args):
+    from tabulate import tabulate
+    _, provider = session.provider(args.account, args.provider)
+    if args.format != 'table':
+        write_rows(provider.iter_nodes(), provider.node_headers, args.format)
+        return
+    print(tabulate(session.node_table(args.account).rows(), headers=provider.node_headers))
+    print("")
+
+def do_nodetypes(session, args):
+    _, provider = session.provider(args.account, args.provider)
+    print(f"Available node types under {args.account}")
+    provider.get_node_types()
+
+def do_usage(session, args):
+    from tabulate import tabulate
+    _, provider = session.provider(args.account, args.provider)
+    user_name = args.username if args.username != "" else os.environ['USER']
+    user_budget = provider.get_budget(user_name=user_name, verbose=False)
+    usage, balance = provider.get_cost_and_usage_from_db(user_name=user_name)
+    print(tabulate([[user_name, user_budget, usage, balance]], headers=["User", 'Allocation', 'Usage', 'Balance']))
+
+def do_refresh_metadata(session, args):
+    _, provider = session.provider(args.account, args.provider)
+    provider.refresh_metadata()
+    print(f"Locations, sizes and images of {args.account} will be listed again on next use")
+
+def do_alloc(session, args):
+    vendor_name, provider = session.provider(args.account, args.provider)
+    print(f"Requesting nodes from {vendor_name} with account {args.account}")
+    provider.create_nodes(args.constraint, [args.jobname], need_confirmation=not args.yes,
+                          walltime=args.walltime, interactive=True)
+    session.invalidate(args.account)
+
+def do_cancel(session, args):
+    vendor_name, provider = session.provider(args.account, args.provider)
+    if "midway3" in vendor_name:
+        instanceID = provider.get_instance_ID(args.jobname)
+        provider.destroy_nodes(IDs=[instanceID], need_confirmation=False)
+    elif args.instance_id != "":
+        provider.destroy_nodes(IDs=[args.instance_id], need_confirmation=False)
+    else:
+        provider.destroy_nodes(node_names=[args.jobname], need_confirmation=False)
+    session.invalidate(args.account)
+
+def do_connect(session, args):
+    session.provider(args.account, args.provider)
+    node_info = session.node_info(args.account, args.jobname)
+    print(f"Connecting to {args.jobname}")
+    os.system(f"ssh {session.ssh_opts(node_info)} {node_info['login']}")
+
+def do_execute(session, args):
+    session.provider(args.account, args.provider)
+    node_info = session.node_info(args.account, args.jobname)
+    script_cmd = utils.script2cmd(args.script)
+    os.system(f"ssh {session.ssh_opts(node_info)} {node_info['login']} -t 'eval {script_cmd}'")
+
+def do_transfer(session, args):
+    session.provider(args.account, args.provider)
+    node_info = session.node_info(args.account, args.jobname)
+    opts = session.ssh_opts(node_info)
+    remote = node_info['login']
+    if args.from_cloud:
+        cmd = f"scp -rC {opts} {remote}:{args.cloud_path} {args.data[0]}"
+    elif args.cloud_path == "":
+        cmd = f"scp -rC {opts} {' '.join(args.data)} {remote}:~/"
+    else:
+        cmd = f"scp -rC {opts} {' '.join(args.data)} {remote}:/{args.cloud_path}"
+    print(f"Executing: {cmd}")
+    os.system(cmd)
+
+def do_run_commands(session, args):
+    with open(args.file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line[0] == '#':
+                continue
+            print(f"skyway> {line}")
+            if not run_line(session, line) and not args.keep_going:
+                raise Exception(f'Command failed: {line}')
+
+def do_shell(session, args):
+    try:
+        import readline
+    except ImportError:
+        pass
+    while True:
+        try:
+            line = input("skyway> ").strip()
+        except EOFError:
+            print("")
+            return
+        if line in ['exit', 'quit']:
+            return
+        if line != "":
+            run_line(session, line)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='skyway', description="Skyway commands sharing one process")
+    subparsers = parser.add_subparsers(dest='command')
+
+    def add_command(name, func, help, job=True):
+        p = subparsers.add_parser(name, help=help)
+        p.add_argument('-A', '--account', dest='account', default="", help="Account name")
+        p.add_argument('--provider', dest='provider', default="", help="Vendor name: AWS, GCP, Azure, or RCC Midway")
+        if job:
+            p.add_argument('-J', '--job-name', dest='jobname', default="", help="Job name")
+        p.set_defaults(func=func)
+        return p
+
+    p = add_command('list', do_list, "List the running VMs of a cloud account", job=False)
+    p.add_argument('--format', dest='format', default="table", choices=['table', 'ndjson', 'csv'],
+                   help="Output format, ndjson and csv write each VM as soon as it is listed")
+    add_command('nodetypes', do_nodetypes, "List the node/VM types of a cloud account", job=False)
+    p = add_command('usage', do_usage, "Usage of a user", job=False)
+    p.add_argument('-u', '--user', dest='username', default="", help="User name")
+    add_command('refresh-metadata', do_refresh_metadata, "Refresh the cached locations, sizes and images of a cloud account", job=False)
+    p = add_command('alloc', do_alloc, "Allocate/provision an instance")
+    p.add_argument('--constraint', dest='constraint', default="", help="Node type")
+    p.add_argument('-t', '--time', dest='walltime', default="", help="Walltime")
+    p.add_argument('-y', '--yes', dest='yes', action='store_true', default=False, help="Do not ask for confirmation")
+    p = add_command('cancel', do_cancel, "Cancel/terminate an instance")
+    p.add_argument('-i', '--instance-id', dest='instance_id', default="", help="Instance ID")
+    add_command('connect', do_connect, "Connect to a running VM")
+    p = add_command('execute', do_execute, "Execute the commands of a script on a running VM")
+    p.add_argument(dest='script', help="Script to run")
+    p = add_command('transfer', do_transfer, "Transfer data to or from a running VM")
+    p.add_argument('--from-cloud', dest='from_cloud', action='store_true', default=False, help="Copy data from cloud if specified")
+    p.add_argument('--cloud-path', dest='cloud_path', default="", help="Path to cloud space, empty for $HOME")
+    p.add_argument(dest='data', nargs='+', help="Data to transfer")
+
+    p = subparsers.add_parser('run-commands', help="Run the commands listed in a file, one per line")
+    p.add_argument(dest='file', help="File of commands, e.g. 'alloc -A rcc-aws -J my-run --constraint t1 -t 01:00:00'")
+    p.add_argument('-k', '--keep-going', dest='keep_going', action='store_true', default=False, help="Continue after a failed command")
+    p.set_defaults(func=do_run_commands)
+    p = subparsers.add_parser('shell', help="Read commands interactively")
+    p.set_defaults(func=do_shell)
+    return parser
+
+def run_line(session, line):
+    '''
+    run one command line of run-commands or shell mode, return False if it failed
+    '''
+    try:
+        args = build_parser().parse_args(shlex.split(line))
+    except SystemExit:
+        # argparse has printed the error or the help
+        return False
+    if args.command is None or args.func in [do_run_commands, do_shell]:
+        print(f"Command is not available here: {line}")
+        return False
+    try:
+        resolve(session, args)
+        args.func(session, args)
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+    return True
+
+def main(argv=None):
+    if os.environ['SKYWAYROOT'] == "":
+        raise Exception("SKYWAYROOT is not defined.")
+
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        args = build_parser().parse_args(['shell'])
+
+    session = Session()
+    try:
+        resolve(session, args)
+        args.func(session, args)
+    finally:
+        session.close()
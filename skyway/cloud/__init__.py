@@ -0,0 +1,127 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Provider registry: map a vendor name to its provider class and import only the
+module of the selected vendor, so that a command for one account does not pay
+for importing the SDKs of all the other vendors.
+"""
+
+from importlib import import_module
+import time
+
+from .. import cfg_path, debug
+from .. import utils
+
+# vendor name (the 'cloud' field in the account .yaml file) -> (module, class name)
+providers = {
+    'aws':   ('skyway.cloud.aws',   'AWS'),
+    'gcp':   ('skyway.cloud.gcp',   'GCP'),
+    'azure': ('skyway.cloud.azure', 'AZURE'),
+    'oci':   ('skyway.cloud.oci',   'OCI'),
+    'slurm': ('skyway.cloud.slurm', 'SLURMCluster'),
+}
+
+# other names used by the CLI and the dashboard for the on-premises clusters
+aliases = {
+    'midway': 'slurm',
+}
+
+def vendor_of(vendor_name: str):
+    '''
+    return the registry key of a vendor name such as "aws", "AWS" or "rcc-midway3"
+    '''
+    name = vendor_name.lower()
+    for vendor in providers:
+        if vendor in name:
+            return vendor
+    for alias, vendor in aliases.items():
+        if alias in name:
+            return vendor
+    raise Exception(f'Cloud vendor {vendor_name} is undefined.')
+
+def get_provider(vendor_name: str):
+    '''
+    return the provider class of a vendor, importing its module on first use
+    '''
+    module_name, class_name = providers[vendor_of(vendor_name)]
+    start = time.perf_counter()
+    module = import_module(module_name)
+    if debug:
+        print(f"Imported {module_name} in {time.perf_counter() - start:.3f} s")
+    return getattr(module, class_name)
+
+def create(account_name: str, vendor_name: str):
+    '''
+    construct the provider object for an account
+    '''
+    provider = get_provider(vendor_name)
+    start = time.perf_counter()
+    account = provider(account_name)
+    if debug:
+        print(f"Connected to {account_name} in {time.perf_counter() - start:.3f} s")
+    return account
+
+def load_catalog(vendor_name: str):
+    '''
+    return the node-type catalog of a vendor from cloud.yaml, without constructing a provider
+    '''
+    from .core import NodeTypeCatalog
+    vendor = vendor_of(vendor_name)
+    vendor_cfg = utils.load_config('cloud', cfg_path)
+    if vendor not in vendor_cfg:
+        raise Exception(f'Cloud vendor {vendor} is undefined.')
+    return NodeTypeCatalog(vendor_cfg[vendor]['node-types'])
+
+def connect(account_name: str, vendor_name: str):
+    '''
+    return the provider of an account held by skywayd when the daemon is running,
+    otherwise construct it in this process
+    '''
+    from .. import daemon
+    account = daemon.connect(account_name, vendor_name)
+    if account is not None:
+        if debug:
+            print(f"Using skywayd for {account_name}")
+        return account
+    return create(account_name, vendor_name)
+
+# columns of the rows of list_accounts()
+account_headers = ['Account', 'Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']
+
+def list_accounts(account_names=None, max_workers=8, show_protected_nodes=False):
+    '''
+    list the nodes of several accounts (all those under $SKYWAYROOT/etc/accounts by default) on a pool of threads,
+    each thread connecting to its account; return the rows of list_nodes() prefixed with the account name
+    (see account_headers) and one report per account {'account', 'vendor', 'nodes', 'seconds', 'error'},
+    an account that fails has its error in the report and no rows
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    from .. import account
+
+    if account_names is None:
+        account_names = account.accounts()
+
+    def list_account(account_name):
+        start = time.perf_counter()
+        report = {'account': account_name, 'vendor': "", 'nodes': 0, 'seconds': 0.0, 'error': None}
+        rows = []
+        try:
+            report['vendor'] = account.registry.vendor(account_name)
+            table = connect(account_name, report['vendor']).node_table(show_protected_nodes)
+            rows = [[account_name] + row for row in table.rows()]
+            report['nodes'] = len(rows)
+        except Exception as e:
+            report['error'] = f"{type(e).__name__}: {e}"
+        report['seconds'] = time.perf_counter() - start
+        return rows, report
+
+    rows = []
+    reports = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(account_names)))) as executor:
+        for account_rows, report in executor.map(list_account, account_names):
+            rows += account_rows
+            reports.append(report)
+    return rows, reports
@@ -7,26 +7,42 @@
 Documentation for AWS Class
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-import io
 import logging
 import os
 import subprocess
 from tabulate import tabulate
 
-from .core import Cloud
+from .core import Cloud, InventoryItem, NodeRecord, NodeTypeCatalog
 from .. import utils
+from ..metadata import DEFAULT_TTL, MetadataCache
 
 from colorama import Fore
-import pandas as pd
 
 # AWS python SDK
 import boto3
+from botocore.exceptions import WaiterError
 
-# It is also possible to use libcloud EC2NodeDriver
-from libcloud.compute.types import Provider
-from libcloud.compute.providers import get_driver
-from libcloud.compute.drivers.ec2 import EC2NodeDriver
+def cached_role_session(fetch, region):
+    """
+    boto3 Session getting its credentials (botocore metadata: access_key, secret_key, token, expiry_time) from fetch(),
+    which is called again when they are about to expire
+    """
+    from botocore.credentials import CredentialProvider, RefreshableCredentials
+    from botocore.session import get_session
+
+    class Provider(CredentialProvider):
+        METHOD = 'skyway-assume-role'
+        CANONICAL_NAME = 'skyway-assume-role'
+
+        def load(self):
+            return RefreshableCredentials.create_from_metadata(metadata=fetch(), refresh_using=fetch, method=self.METHOD)
+
+    botocore_session = get_session()
+    # ahead of the environment and the config files in the credential chain of the session
+    botocore_session.get_component('credential_provider').insert_before('env', Provider())
+    return boto3.Session(botocore_session=botocore_session, region_name=region)
 
 class AWS(Cloud):
     """Documentation for AWS Class
@@ -61,11 +77,13 @@ class AWS(Cloud):
             raise Exception(f'Cloud vendor aws is undefined.')
 
         self.vendor = vendor_cfg['aws']
+        self.catalog = NodeTypeCatalog(self.vendor['node-types'])
         self.account_name = account
         self.onpremises = False
 
-        # using_trusted_agent = False means that no use of master account key and secret as defined in cloud.yaml
-        self.using_trusted_agent = False
+        # using_trusted_agent = False means that no use of master account key and secret as defined in cloud.yaml,
+        # set using_trusted_agent: True in the account section to assume the role of the account with them
+        self.using_trusted_agent = self.account.get('using_trusted_agent', False)
         if self.using_trusted_agent == False:
             # This is how the existing skyway creates the ec2 resource without master for rcc-aws
             self.ec2 = boto3.resource('ec2',
@@ -74,25 +92,24 @@ class AWS(Cloud):
                                        region_name = self.account['region'])
         else:
             # This is how the testing skyway (midway3 VM) for rcc-aws: uses the IAM rcc-skyway as a trusted agent from the RCC-Skyway account (391009850283)
-            self.client = boto3.client('sts',
-                aws_access_key_id = self.vendor['master_access_key_id'],
-                aws_secret_access_key = self.vendor['master_secret_access_key'])
-
-            self.assumed_role = self.client.assume_role(
-                RoleArn = "arn:aws:iam::%s:role/%s" % (self.account['account_id'], self.account['role_name']), 
-                RoleSessionName = "RCCSkyway"
-            )
-            credentials = self.assumed_role['Credentials']
-            self.ec2 = boto3.resource('ec2',
-                                      aws_access_key_id = credentials['AccessKeyId'],
-                                      aws_secret_access_key = credentials['SecretAccessKey'],
-                                      aws_session_token= credentials['SessionToken'],
-                                      region_name = self.account['region'])
+            # the assumed role session is shared by all the commands until shortly before it expires
+            from ..credentials import CredentialCache
+
+            self.credential_cache = CredentialCache(account)
+            session = cached_role_session(lambda: self.credential_cache.get('sts', self.assume_role), self.account['region'])
+            self.ec2 = session.resource('ec2')
         self.using_libcloud = False
         if self.using_libcloud:
+            # It is also possible to use libcloud EC2NodeDriver (imported only when used)
+            from libcloud.compute.types import Provider
+            from libcloud.compute.providers import get_driver
             EC2 = get_driver(Provider.EC2)
             self.driver = EC2(self.account['access_key_id'], self.account['secret_access_key'], self.account['region'])
         
+        # images change rarely: list them at most once per metadata_ttl seconds
+        ttl = self.account.get('metadata_ttl', self.vendor.get('metadata_ttl', DEFAULT_TTL))
+        self.metadata = MetadataCache(account, self.account['region'], ttl)
+
         # copy ssh pem file to ~/, change the permission to 400
         pem_file_full_path = account_path + self.account['key_name'] + '.pem'
         self.my_ssh_private_key =  f"~/.my_aws_ssh_key.pem"
@@ -100,47 +117,35 @@ class AWS(Cloud):
         p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
 
        
-    def list_nodes(self, show_protected_nodes=False, verbose=False):
-        """Member function: list_nodes
-        Get a list of all existed instances
-        
-        Return: a list of multiple turple. Each turple has four elements:
-                (1) instance name (2) state (3) type (4) identifier
+    def assume_role(self):
         """
-        
-        instances = self.get_instances()
-        nodes = []
-        
-        for instance in instances:
-            node_name = self.get_instance_name(instance)
-            if show_protected_nodes == False and node_name in self.account['protected_nodes']:
-                continue
-
-            if instance.state['Name'] != 'terminated':
-                running_time = datetime.now(timezone.utc) - instance.launch_time
-                
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.total_seconds()/3600.0 * instance_unit_cost
-                instance_user_name = self.get_instance_user_name(instance)
+        Assume the role of the account with the master key in cloud.yaml,
+        return the session credentials in the format of botocore and their expiry time
+        """
+        client = boto3.client('sts',
+            aws_access_key_id = self.vendor['master_access_key_id'],
+            aws_secret_access_key = self.vendor['master_secret_access_key'])
 
-                nodes.append([self.get_instance_name(instance),
-                              instance_user_name,
-                              instance.state['Name'],
-                              instance.instance_type, 
-                              instance.instance_id,
-                              instance.public_ip_address,
-                              running_time,
-                              running_cost])
-        
-        output_str = ''
-        if verbose == True:
-            print(tabulate(nodes, headers=['Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']))
-            print("")
-        else:
-            output_str = io.StringIO()
-            print(tabulate(nodes, headers=['Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']), file=output_str)
-            print("", file=output_str)
-        return nodes, output_str
+        assumed_role = client.assume_role(
+            RoleArn = "arn:aws:iam::%s:role/%s" % (self.account['account_id'], self.account['role_name']), 
+            RoleSessionName = "RCCSkyway"
+        )
+        credentials = assumed_role['Credentials']
+        metadata = {'access_key': credentials['AccessKeyId'],
+                    'secret_key': credentials['SecretAccessKey'],
+                    'token': credentials['SessionToken'],
+                    'expiry_time': credentials['Expiration'].isoformat()}
+        return metadata, credentials['Expiration'].timestamp()
+
+    def node_record(self, item):
+        """Member function: node_record
+        The NodeRecord of an instance, None if terminated
+        """
+        instance = item.instance
+        if item.state == 'terminated':
+            return None
+        return NodeRecord(item.name, item.owner, item.state, instance.instance_type, item.id, item.ip,
+                          instance.launch_time, self.get_unit_price_instance(instance))
 
     def create_nodes(self, node_type: str, node_names = [], interactive = False, need_confirmation = True, walltime = None):
         """Member function: create_compute
@@ -158,7 +163,7 @@ class AWS(Cloud):
         running_cost = self.get_running_cost(verbose=False)
         usage = usage + running_cost
         remaining_balance = user_budget - usage
-        unit_price = self.vendor['node-types'][node_type]['price']
+        unit_price = self.catalog[node_type].price
         if need_confirmation == True:
             print(f"User budget: ${user_budget:.3f}")
             print(f"+ Usage    : ${usage:.3f}")
@@ -178,7 +183,7 @@ class AWS(Cloud):
             ImageId          = self.account['ami_id'],    # self.vendor['ami_id']
             KeyName          = self.account['key_name'],  # self.vendor['key_name']
             SecurityGroupIds = self.account['security_group'],
-            InstanceType     = self.vendor['node-types'][node_type]['name'],
+            InstanceType     = self.catalog[node_type].name,
             MaxCount         = count,
             MinCount         = count,
             TagSpecifications=[
@@ -198,9 +203,21 @@ class AWS(Cloud):
 
             ])
 
-        for instance in instances:
-            instance.wait_until_running()
-        
+        # the request tags all the instances with the first name, the other nodes get their own
+        client = self.ec2.meta.client
+        for inode, instance in enumerate(instances):
+            if node_names[inode] != node_name:
+                client.create_tags(Resources=[instance.instance_id], Tags=[{'Key': 'Name', 'Value': node_names[inode]}])
+
+        # one waiter for all the instances, then one call to describe them
+        IDs = [instance.instance_id for instance in instances]
+        try:
+            client.get_waiter('instance_running').wait(InstanceIds=IDs)
+        except WaiterError as e:
+            print(Fore.RED + f"\nNot all the instances are running: {e}" + Fore.RESET)
+        self.invalidate_inventory()
+        described = {instance.instance_id: instance for instance in self.ec2.instances.filter(InstanceIds=IDs)}
+
         nodes = {}
         # .pem file is the private key of the local machine that has a correponding public key listed
         # as in ~/.ssh/authorized_keys on the node
@@ -217,36 +234,59 @@ class AWS(Cloud):
         pt = datetime.strptime(walltime_str, "%H:%M:%S")
         walltime_in_minutes = int(pt.hour * 60 + pt.minute + pt.second/60)
 
-        for inode, instance in enumerate(instances):
-            instance.load()
+        # perform post boot tasks on each node
+        #   + mounting storage (/home, /software) from io-server 172.31.47.245 (private IP of the rcc-io node) (rcc-aws, not using a trusted agent)
+        #   + executing some custom scripts
+        #   + shut down the instance after the walltime
+        io_server = "172.31.47.245"
+
+        def bootstrap(instance):
+            ip_converted = instance.public_ip_address.replace('.','-')
+            # need to install nfs-utils on the VM (or having an image that has nfs-utils installed)
+            #cmd = f"ssh -i {pem_file_full_path} {username}@ec2-{ip_converted}.{region}.compute.amazonaws.com -t 'sudo mount -t nfs 172.31.47.245:/skyway /home' "
+            cmd = f"ssh -i {self.my_ssh_private_key} -o StrictHostKeyChecking=accept-new {username}@ec2-{ip_converted}.{region}.compute.amazonaws.com "
+            #cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mkdir -p /software; sudo mount -t nfs {io_server}:/skyway /home; sudo mount -t nfs {io_server}:/software /software' "
+            cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mkdir -p /cloud/rcc-aws; sudo mount -t nfs {io_server}:/cloud/rcc-aws /cloud/rcc-aws' "
+            return subprocess.run(cmd, shell=True, text=True, capture_output=True)
+
+        # the nodes are bootstrapped at the same time, the slowest one sets the time to ready
+        ready = [instance for instance in described.values()
+                 if instance.state['Name'] == 'running' and instance.public_ip_address is not None]
+        results = {}
+        if len(ready) > 0:
+            with ThreadPoolExecutor(max_workers=min(16, len(ready))) as executor:
+                futures = {executor.submit(bootstrap, instance): instance.instance_id for instance in ready}
+                for future in as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        results[futures[future]] = e
+
+        for inode, ID in enumerate(IDs):
+            instance = described.get(ID)
+            if ID not in results:
+                state = instance.state['Name'] if instance is not None else 'unknown'
+                print(Fore.RED + f"\nInstance {node_names[inode]} {ID} failed to start (state: {state})" + Fore.RESET)
+                continue
 
             # record node_type, launch time
             instance_type = str(instance.instance_type)
             launch_time = instance.launch_time.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
             nodes[node_names[inode]] = [instance_type, launch_time, str(instance.public_ip_address)]
-
-            # perform post boot tasks on each node
-            #   + mounting storage (/home, /software) from io-server 172.31.47.245 (private IP of the rcc-io node) (rcc-aws, not using a trusted agent)
-            #   + executing some custom scripts
-            #   + shut down the instance after the walltime
-            io_server = "172.31.47.245"
-            ip = instance.public_ip_address
-            ip_converted = ip.replace('.','-')
+            self.index_job(node_names[inode], instance.instance_id, instance.public_ip_address, instance_type,
+                           instance.launch_time, walltime_str)
 
             print(f"\nCreated instance: {node_names[inode]}")
+            result = results[ID]
+            if isinstance(result, Exception) or result.returncode != 0:
+                reason = result if isinstance(result, Exception) else (result.stderr.strip().splitlines() or ['ssh failed'])[-1]
+                print(Fore.RED + f"Post-boot setup failed on {node_names[inode]}: {reason}" + Fore.RESET)
 
-            # need to install nfs-utils on the VM (or having an image that has nfs-utils installed)
-            #cmd = f"ssh -i {pem_file_full_path} {username}@ec2-{ip_converted}.{region}.compute.amazonaws.com -t 'sudo mount -t nfs 172.31.47.245:/skyway /home' "
-
+            ip_converted = instance.public_ip_address.replace('.','-')
             print("To connect to the instance, run:")
             cmd = f"ssh -i {self.my_ssh_private_key} -o StrictHostKeyChecking=accept-new {username}@ec2-{ip_converted}.{region}.compute.amazonaws.com "
-            
             print(f"  {cmd} or")
             print(f"  skyway_connect --account={self.account_name} -J {node_names[inode]}")
-            #cmd = f"ssh -i {pem_file_full_path} -o StrictHostKeyChecking=accept-new {username}@ec2-{ip_converted}.{region}.compute.amazonaws.com "
-            #cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mkdir -p /software; sudo mount -t nfs {io_server}:/skyway /home; sudo mount -t nfs {io_server}:/software /software' "
-            cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mkdir -p /cloud/rcc-aws; sudo mount -t nfs {io_server}:/cloud/rcc-aws /cloud/rcc-aws' "
-            p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
 
         return nodes
 
@@ -331,14 +371,11 @@ class AWS(Cloud):
 
     def destroy_nodes(self, node_names=None, IDs=None, need_confirmation=True):
         """Member function: destroy nodes
-        Destroy all the nodes (instances) given the list of node names
-                 - node_names: a list of node names to be destroyed
-        NOTE: should store the running cost and time before terminating the node(s)
-        NOTE: may need to revise for using IDs instead of node names, as IDs are unique
-              for ID in IDs:
-                  instance = self.ec2.Instance(ID)
-                  if self.get_instance_name(instance) in self.account['protected_nodes']:
-                      continue
+        Destroy all the nodes (instances) given the list of node names or instance IDs
+                 - node_names: a list of node names to be destroyed, all the instances of a name (e.g. of a job) are destroyed
+                 - IDs: a list of instance IDs to be destroyed
+        The instances are found with one filtered DescribeInstances call, terminated with one TerminateInstances call
+        per 1000 IDs and their running time and cost recorded with one write to the usage history.
         """
         
         user_name = os.environ['USER']
@@ -346,100 +383,70 @@ class AWS(Cloud):
         if node_names is None and IDs is None:
             raise ValueError(f"node_names and IDs cannot be both empty.")
 
-        instances = []
         if node_names is not None:
             if isinstance(node_names, str): node_names = [node_names]
+            node_names = [name for name in node_names if name not in self.account['protected_nodes']]
+            items = self.find_instances(names=node_names, states=["running", "stopped"]) if node_names else []
+            found = set(item.name for item in items)
             for name in node_names:
-                if name in self.account['protected_nodes']:
-                    continue
-                
-                avail_instances = self.get_instances(filters = [{
-                    "Name" : "instance-state-name",
-                    "Values" : ["running", "stopped"]
-                }])
-                
-                instance = next((inst for inst in avail_instances if self.get_instance_name(inst) == name), None)
-                if instance is None:
+                if name not in found:
                     raise ValueError(f"Instance '{name}' not found.")
-
-                running_time = datetime.now(timezone.utc) - instance.launch_time
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-                instance_user_name = self.get_instance_user_name(instance)
-                if instance_user_name != user_name:
-                    print(f"Cannot destroy an instance {name} created by other users")
-                    continue
-
-                if need_confirmation == True: 
-                    response = input(f"Do you want to terminate the node {name} {instance.instance_id} (running cost ${running_cost:0.5f})? (y/n) ")
-                    if response != 'y':
-                        continue
-
-                instance.terminate()
-   
-                # record the running time and cost
-                running_time = datetime.now(timezone.utc) - instance.launch_time
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-                usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
-
-                # store the record into the database
-                data = [instance_user_name, instance.instance_id, instance.instance_type,
-                        instance.launch_time, datetime.now(timezone.utc), running_cost, remaining_balance]
-                if os.path.isfile(self.usage_history):
-                    df = pd.read_pickle(self.usage_history)
-                else:
-                    df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost', 'Balance'])
-
-                df = pd.concat([pd.DataFrame([data], columns=df.columns), df], ignore_index=True)
-                df.to_pickle(self.usage_history)
-
-                instances.append(instance)
         else:
+            if isinstance(IDs, str): IDs = [IDs]
+            items = self.find_instances(ids=IDs)
+            found = set(item.id for item in items)
             for ID in IDs:
-                instance = self.ec2.Instance(ID)
-                if self.get_instance_name(instance) in self.account['protected_nodes']:
-                    continue
-
-                instance_user_name = self.get_instance_user_name(instance)
-                if instance_user_name != user_name:
-                    print(f"Cannot destroy an instance {name} from other users")
-                    continue
-
-                if instance is None:
-                    raise ValueError(f"Instance '{instance.name}' not found.")
-
-                running_time = datetime.now(timezone.utc) - instance.launch_time
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-
-                response = input(f"Do you want to terminate the node {instance.instance_id} (running cost ${running_cost:0.5f})? (y/n) ")
-                if response != 'y':
-                    continue
-
-                # record the running time and cost
-                running_time = datetime.now(timezone.utc) - instance.launch_time
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-                usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
+                if ID not in found:
+                    raise ValueError(f"Instance '{ID}' not found.")
+            items = [item for item in items if item.name not in self.account['protected_nodes']]
+
+        end_time = datetime.now(timezone.utc)
+        targets = []
+        for item in items:
+            if item.owner != user_name:
+                print(f"Cannot destroy an instance {item.name} created by other users")
+                continue
+            instance = item.instance
+            running_time = end_time - instance.launch_time
+            running_cost = running_time.total_seconds()/3600.0 * self.get_unit_price_instance(instance)
+            targets.append((instance, running_cost))
 
-                # store the record into the database
-                data = [instance_user_name, instance.instance_id, instance.instance_type,
-                        instance.launch_time, datetime.now(timezone.utc), running_cost, remaining_balance]
+        if len(targets) == 0:
+            return
 
-                if os.path.isfile(self.usage_history):
-                    df = pd.read_pickle(self.usage_history)
-                else:
-                    df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost', 'Balance'])
+        if need_confirmation == True:
+            if len(targets) == 1:
+                instance, running_cost = targets[0]
+                question = f"Do you want to terminate the node {self.get_instance_name(instance)} {instance.instance_id} (running cost ${running_cost:0.5f})? (y/n) "
+            else:
+                for instance, running_cost in targets:
+                    print(f"  {self.get_instance_name(instance)} {instance.instance_id} (running cost ${running_cost:0.5f})")
+                question = f"Do you want to terminate these {len(targets)} nodes? (y/n) "
+            response = input(question)
+            if response != 'y':
+                return
 
-                df = pd.concat([pd.DataFrame([data], columns=df.columns), df], ignore_index=True)
-                df.to_pickle(self.usage_history)
+        # TerminateInstances accepts up to 1000 IDs per call
+        client = self.ec2.meta.client
+        IDs = [instance.instance_id for instance, _ in targets]
+        chunks = [IDs[i:i+1000] for i in range(0, len(IDs), 1000)]
+        for chunk in chunks:
+            client.terminate_instances(InstanceIds=chunk)
+        self.job_index.remove(ids=IDs)
 
-                instance.terminate()
-                instances.append(instance)
+        # record the running time and cost, each row with the balance left before its instance
+        usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
+        rows = []
+        for instance, running_cost in targets:
+            rows.append([user_name, instance.instance_id, instance.instance_type,
+                         instance.launch_time, end_time, running_cost, remaining_balance])
+            remaining_balance -= running_cost
+        self.record_usage(rows)
 
-        for instance in instances:
-            instance.wait_until_terminated()
+        waiter = client.get_waiter('instance_terminated')
+        for chunk in chunks:
+            waiter.wait(InstanceIds=chunk)
+        self.invalidate_inventory()
 
 
     def check_valid_user(self, user_name, verbose=False):
@@ -494,6 +501,7 @@ class AWS(Cloud):
         compute the accumulating cost from the pkl database
         and the remaining balance
         '''
+        import pandas as pd
         if user_name not in self.users:
             raise Exception(f"{user_name} is not listed in the user group of this account.")
                 
@@ -562,23 +570,7 @@ class AWS(Cloud):
         """
         List all the node (instance) types provided by the vendor and their unit prices
         """
-        node_info = []
-        for node_type in self.vendor['node-types']:
-            if 'gpu' in self.vendor['node-types'][node_type]:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              self.vendor['node-types'][node_type]['gpu'],
-                              self.vendor['node-types'][node_type]['gpu-type'],
-                              self.vendor['node-types'][node_type]['price']])
-            else:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              "0",
-                              "--",
-                              self.vendor['node-types'][node_type]['price']])
-        print(tabulate(node_info, headers=['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost ($)']))
+        print(tabulate(self.catalog.rows(), headers=NodeTypeCatalog.headers))
         print("")
 
     def get_group_members(self):
@@ -596,10 +588,7 @@ class AWS(Cloud):
         Return identifiers of all running instances
         """
 
-        instances = self.get_instances(filters = [{
-            "Name" : "instance-state-name",
-            "Values" : ["running"]
-        }])
+        instances = self.get_inventory().instances(states=["running"])
         
         nodes = []
         
@@ -622,26 +611,29 @@ class AWS(Cloud):
         """
         
         if instance_ID[0:2] == 'i-':
-            instances = self.get_instances(filters = [{
-                "Name" : "instance-id",
-                "Values" : [instance_ID]
-            }])
+            item = self.lookup_job(instance_id=instance_ID)
         else:
-            instances = self.get_instances(filters = [{
-                "Name" : "tag:Name",
-                "Values" : [instance_ID]
-            }])
+            item = self.lookup_job(name=instance_ID)
+        if item is None:
+            raise ValueError(f"Instance '{instance_ID}' not found.")
         
-        return list(instances)[0].public_ip_address
+        return item.ip
 
 
-    def get_all_images(self, owners=['self']):
-        try:
+    def get_all_images(self, owners=['self'], refresh=False):
+        '''
+        print and return the AMIs (ID, name, description) of the given owners
+        '''
+        def fetch():
             # Describe images to get all AMIs
-            images = self.ec2.images.filter(Owners=owners)
+            return [(image.id, image.name, image.description) for image in self.ec2.images.filter(Owners=owners)]
 
-            for image in images:
-                print(f"Image ID: {image.id}, Name: {image.name}, Description: {image.description}")
+        try:
+            images = self.metadata.get('images:' + ','.join(owners), fetch, refresh=refresh)
+
+            for image_id, name, description in images:
+                print(f"Image ID: {image_id}, Name: {name}, Description: {description}")
+            return images
 
         except Exception as e:
             print(f"An error occurred: {e}")
@@ -669,19 +661,8 @@ class AWS(Cloud):
         Note: AWS doesn't use unique name for instances, instead, name is an
         attribute stored in the tags.        
         """
-        running_instances = self.get_instances(filters = [{
-                    "Name" : "instance-state-name",
-                    "Values" : ["running"]
-        }])
-                
-        for instance in running_instances:
-            if instance.tags is None: continue
-
-            for tag in instance.tags:
-                if tag['Key'] == 'Name':
-                    if tag['Value'] == instance_name:
-                        return instance.instance_id
-        return ''
+        item = self.lookup_job(name=instance_name)
+        return item.id if item is not None else ''
 
     def get_instance_user_name(self, instance):
         """Member function: get_instance_user_name
@@ -706,26 +687,53 @@ class AWS(Cloud):
         """
         return self.ec2.instances.filter(Filters = filters)
 
+    def inventory_item(self, instance):
+        # name and user from one pass over the tags
+        tags = {tag['Key']: tag['Value'] for tag in instance.tags or []}
+        return InventoryItem(tags.get('Name', ''),
+                             instance.instance_id,
+                             instance.public_ip_address,
+                             tags.get('User', ''),
+                             instance.state['Name'],
+                             instance)
+
+    def iter_inventory(self):
+        """
+        List all the instances of the account with one (paginated) DescribeInstances call
+        """
+        for instance in self.get_instances():
+            yield self.inventory_item(instance)
+
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        """
+        List the instances with the given names (Name tag) or IDs, owner (User tag) and states
+        with one DescribeInstances call filtered by EC2
+        """
+        filters = []
+        if names is not None:
+            filters.append({'Name': 'tag:Name', 'Values': list(names)})
+        if ids is not None:
+            filters.append({'Name': 'instance-id', 'Values': list(ids)})
+        if owner is not None:
+            filters.append({'Name': 'tag:User', 'Values': [owner]})
+        if states is not None:
+            filters.append({'Name': 'instance-state-name', 'Values': list(states)})
+        return [self.inventory_item(instance) for instance in self.get_instances(filters)]
+
     def get_unit_price_instance(self, instance):
         """
         Get the per-hour price of an instance depending on its instance_type (e.g. t2.micro)
         """
-        for node_type in self.vendor['node-types']:
-            if self.vendor['node-types'][node_type]['name'] == instance.instance_type:
-                unit_price = self.vendor['node-types'][node_type]['price']
-                return unit_price
-        return -1.0
+        return self.catalog.instance_price(instance.instance_type)
 
     def get_unit_price(self, node_type: str):
         """
         Get the per-hour price of an instance depending on its node type (e.g. t1)
         """
-        if node_type in self.vendor['node-types']:
-            return self.vendor['node-types'][node_type]['price']
-        return -1.0
+        return self.catalog.price(node_type)
 
     def get_running_cost(self, verbose=True):
-        instances = self.get_instances()
+        instances = self.get_inventory().instances()
 
         nodes = []
         total_cost = 0.0
@@ -6,27 +6,129 @@
 Documentation for Azure Class
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-import io
-import logging
 import os
 import subprocess
 from tabulate import tabulate
 
-from .core import Cloud
+from .core import Cloud, InventoryItem, NodeRecord, NodeTypeCatalog
 from .. import utils
+from ..credentials import CachedTokenCredential, CredentialCache
+from ..metadata import DEFAULT_TTL, MetadataCache
 
 from colorama import Fore
-import pandas as pd
 
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import ClientSecretCredential
 from azure.mgmt.compute import ComputeManagementClient
+from azure.mgmt.compute.models import (HardwareProfile, ImageReference, LinuxConfiguration, ManagedDiskParameters,
+                                       NetworkInterfaceReference, NetworkProfile, OSDisk, OSProfile, SshConfiguration,
+                                       SshPublicKey, StorageProfile, VirtualMachine)
 from azure.mgmt.network import NetworkManagementClient
+from azure.mgmt.network.models import (AddressSpace, NetworkInterface, NetworkInterfaceIPConfiguration, PublicIPAddress,
+                                       Subnet, VirtualNetwork)
 from azure.mgmt.resource import ResourceManagementClient
 
 from libcloud.compute.types import Provider
 from libcloud.compute.providers import get_driver
-from libcloud.compute.drivers.azure_arm import AzureImage, NodeAuthSSHKey
+
+# state of a VM from the codes of its instance view, named as libcloud does (ProvisioningState first, then PowerState)
+PROVISIONING_STATES = {'creating': 'pending', 'deleting': 'terminated', 'failed': 'error', 'updating': 'updating'}
+POWER_STATES = {'running': 'running', 'starting': 'starting', 'stopping': 'stopping', 'stopped': 'paused',
+                'deallocating': 'pending', 'deallocated': 'stopped'}
+
+def vm_state(vm):
+    """
+    the state of a VirtualMachine listed with its instance view
+    """
+    statuses = vm.instance_view.statuses if vm.instance_view is not None else None
+    state = 'unknown'
+    for status in statuses or []:
+        kind, _, code = (status.code or '').partition('/')
+        if kind == 'ProvisioningState' and code.split('/')[0] in PROVISIONING_STATES:
+            return PROVISIONING_STATES[code.split('/')[0]]
+        if kind == 'PowerState' and code in POWER_STATES:
+            state = POWER_STATES[code]
+    return state
+
+def vm_size(vm):
+    """
+    the size of a VirtualMachine (e.g. Standard_DS1_v2), the SDK returns the known sizes as enum members
+    """
+    size = vm.hardware_profile.vm_size
+    return getattr(size, 'value', size)
+
+def vm_nic_id(vm):
+    """
+    the ID (lower case) of the primary network interface of a VirtualMachine
+    """
+    nics = vm.network_profile.network_interfaces if vm.network_profile is not None else None
+    if not nics:
+        return None
+    nic = next((nic for nic in nics if nic.primary), nics[0])
+    return nic.id.lower()
+
+def resource_names(resource_id):
+    """
+    the resource group and the names in an Azure resource ID, e.g. (rg, vnet, subnet) for
+    /subscriptions/<id>/resourceGroups/rg/providers/Microsoft.Network/virtualNetworks/vnet/subnets/subnet
+    """
+    parts = resource_id.split('/')
+    return [parts[4]] + parts[8::2]
+
+class ProvisioningPipeline():
+    """
+    Azure resources created as a dependency graph: a step starts its long-running operation (LRO) once the steps
+    it depends on are done, so that the steps independent of each other (e.g. the resources of different nodes) run
+    at the same time. Steps are added after the steps they depend on.
+    """
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self.executor = None
+        self.futures = {}
+
+    def add(self, key, start, depends=()):
+        '''
+        add a step: start(*results of the steps it depends on) returns an LRO poller (or a result right away)
+        '''
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        requirements = [self.futures[dependency] for dependency in depends]
+
+        def run():
+            poller = start(*[future.result() for future in requirements])
+            return poller.result() if hasattr(poller, 'result') else poller
+
+        self.futures[key] = self.executor.submit(run)
+
+    def wait(self, keys):
+        '''
+        wait for all the steps, return a dict key -> result (or the exception of the step, or of a step it depends on)
+        '''
+        results = {}
+        for key in keys:
+            try:
+                results[key] = self.futures[key].result()
+            except Exception as e:
+                results[key] = e
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        return results
+
+def cached_token_driver(credential):
+    """
+    libcloud AzureNodeDriver getting its bearer token from a TokenCredential instead of logging in for each process
+    """
+    Azure = get_driver(Provider.AZURE_ARM)
+
+    class Connection(Azure.connectionCls):
+        def get_token_from_credentials(self):
+            token = credential.get_token(self.login_resource + '.default')
+            self.access_token = token.token
+            self.expires_on = token.expires_on
+
+    return type('AzureNodeDriver', (Azure,), {'connectionCls': Connection})
 
 class AZURE(Cloud):
 
@@ -63,71 +165,45 @@ class AZURE(Cloud):
             raise Exception(f'Service provider azure is undefined.')
       
         self.vendor = vendor_cfg['azure']
+        self.catalog = NodeTypeCatalog(self.vendor['node-types'])
         self.account_name = account
         self.onpremises = False
 
-        self.credentials = ClientSecretCredential(client_id=self.account['client_id'],
-                                                  client_secret=self.account['client_secret'],
-                                                  tenant_id=self.account['tenant_id'])
+        # the Azure AD tokens are shared by all the commands until shortly before they expire
+        self.credentials = CachedTokenCredential(ClientSecretCredential(client_id=self.account['client_id'],
+                                                                        client_secret=self.account['client_secret'],
+                                                                        tenant_id=self.account['tenant_id']),
+                                                 CredentialCache(account))
 
         try:
-            Azure = get_driver(Provider.AZURE_ARM)
-            self.driver = Azure(tenant_id=self.credentials._tenant_id,
+            Azure = cached_token_driver(self.credentials)
+            self.driver = Azure(tenant_id=self.account['tenant_id'],
                                 subscription_id=self.account['subscription_id'],
-                                key=self.credentials._client_id,
+                                key=self.account['client_id'],
                                 secret=self.account['client_secret'])
 
         except Exception as e:
             print(f"An error occurred: {e}")
        
         assert(self.driver != False)
+
+        # the VMs and their public IPs are listed with the Azure SDK, which returns the power states
+        # and the sizes in one paged call instead of one call per VM with libcloud
+        self.compute_client = ComputeManagementClient(self.credentials, self.account['subscription_id'])
+        self.network_client = NetworkManagementClient(self.credentials, self.account['subscription_id'])
+
+        # locations and VM sizes change rarely: list them at most once per metadata_ttl seconds
+        ttl = self.account.get('metadata_ttl', self.vendor.get('metadata_ttl', DEFAULT_TTL))
+        self.metadata = MetadataCache(account, ttl=ttl, driver=self.driver)
         return
 
-    def list_nodes(self, show_protected_nodes=False, verbose=False):
-        """Member function: list_nodes
-        Get a list of all existed instances
-        
-        Return: a list of multiple turple. Each turple has four elements:
-                (1) instance name (2) state (3) type (4) running time
-                node.id is useful for destroying
+    def node_record(self, item):
+        """Member function: node_record
+        The NodeRecord of a VM, node.id is useful for destroying
         """
-        nodes = []
-        current_time = datetime.now(timezone.utc)
-        for node in self.driver.list_nodes():
-            
-            # Get the creation time of the instance
-            creation_time_str = node.extra.get('properties')['timeCreated']  # Azure
-            if creation_time_str:
-                # Convert the creation time from string to datetime object
-                # Azure returns 7-digit after '.' for seconds, so need to truncate the last digit 
-                # to cast into %Y-%m-%dT%H:%M:%S.%f%z format
-                idx = creation_time_str.find('+')
-                creation_time_str = creation_time_str[:idx-1] + creation_time_str[idx:]
-                
-                creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-                
-                # get the node type
-                node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-
-                # Calculate the running time
-                running_time = current_time - creation_time
-                
-                # get the node type
-                node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-                instance_unit_cost = self.get_unit_price_instance(node)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-             
-                nodes.append([node.name, node.state, node_type, node.id, "n/a", running_time, running_cost])
-
-        output_str = ''
-        if verbose == True:
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']))
-            print("")
-        else:
-            output_str = io.StringIO()
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']), file=output_str)
-            print("", file=output_str)
-        return nodes, output_str            
+        vm = item.instance
+        return NodeRecord(item.name, item.owner, item.state, vm_size(vm), item.id, item.ip,
+                          utils.parse_iso(vm.time_created), self.get_unit_price_instance(vm))
 
     def create_nodes(self, node_type: str, node_names = [], interactive = False, need_confirmation = True, walltime = None):
         user_name = os.environ['USER']
@@ -136,7 +212,7 @@ class AZURE(Cloud):
         running_cost = self.get_running_cost(verbose=False)
         usage = usage + running_cost
         remaining_balance = user_budget - usage
-        unit_price = self.vendor['node-types'][node_type]['price']
+        unit_price = self.catalog[node_type].price
         if need_confirmation == True:
             print(f"User budget: ${user_budget:.3f}")
             print(f"+ Usage    : ${usage:.3f}")
@@ -149,7 +225,7 @@ class AZURE(Cloud):
         print(Fore.BLUE + f"Allocating {count} instance ...", end=" ")
 
         nodes = {}
-        node_cfg = self.vendor['node-types'][node_type]
+        node_cfg = self.catalog[node_type].cfg
         size_name = node_cfg['name']           # e.g. "Standard_DS1_v2"
         
         if walltime is None:
@@ -162,100 +238,100 @@ class AZURE(Cloud):
         walltime_in_minutes = int(pt.hour * 60 + pt.minute + pt.second/60)
 
         location_name = 'East US'  # Replace with your desired location
-        locations = self.driver.list_locations()
-        location = next((loc for loc in locations if loc.name == location_name), None)
-        if location is None:
-            raise ValueError(f"Location '{location_name}' not found.")
 
         # authentication with public key on this machine per-user (id_rsa_azure.pub)
         # need to read in from ~/.ssh/id_rsa_azure.pub from the account .yaml file
-        auth = NodeAuthSSHKey(self.public_key)
-
-        # Initialize Azure management clients
-        subscription_id = self.account['subscription_id']
-        resource_client = ResourceManagementClient(self.credentials, subscription_id)
-        network_client = NetworkManagementClient(self.credentials, subscription_id)
-        compute_client = ComputeManagementClient(self.credentials, subscription_id)
-
-        sizes = self.driver.list_sizes(location=location)
-        size = next((s for s in sizes if s.name == size_name), None)
-        if size is None:
-            raise ValueError(f"Size '{size_name}' not found.")
+        admin_user = 'azureuser'
 
         # select an image
         publisher = 'Canonical'
         offer = 'UbuntuServer'
         sku = '18.04-LTS'
         version = 'latest'
-        image = AzureImage(version=version, publisher=publisher, sku=sku, offer=offer, driver=self.driver, location=location)
 
         # Step 2: Create a resource group if it doesn't exist    
         # resource group is already created on the subscription (could move to account)
+        subscription_id = self.account['subscription_id']
+        resource_client = ResourceManagementClient(self.credentials, subscription_id)
         resource_group_name = self.account['resource_group']   #"rg_skyway"
         resource_client.resource_groups.create_or_update(resource_group_name, {"location": location_name})
 
-        # then for each node in the list
-        for node_name in node_names:
-            
-            # Step 3: Create Virtual Network and Subnet if they don't exist
-            vnet_name = "vnet-{}-{}".format(user_name, node_name)
-            subnet_name = "subnet-{}-{}".format(user_name, node_name)
-            vnet_params = {
-                "location": location_name,
-                "address_space": {"address_prefixes": ["10.0.0.0/16"]}
-            }
-            network_client.virtual_networks.begin_create_or_update(resource_group_name, vnet_name, vnet_params).result()
-
-            subnet_params = {
-                "address_prefix": "10.0.0.0/24"
-            }
-            network_client.subnets.begin_create_or_update(resource_group_name, vnet_name, subnet_name, subnet_params).result()
-
-            # Step 4: Create a network interface
-            nic_name = "my-nic-{}".format(user_name, node_name)
-            public_ip = self.driver.ex_create_public_ip(name=f'my_public_ip-{user_name}-{node_name}',
-                                                        resource_group=resource_group_name,
-                                                        location=location)
-            ip_config = {
-                "name": "ipconfig1",
-                "subnet": {"id": 
-                               f"/subscriptions/{subscription_id}/resourceGroups/{resource_group_name}/providers/Microsoft.Network/virtualNetworks/{vnet_name}/subnets/{subnet_name}"
-                          },
-                'public_ip': public_ip
-            }
-        
-            nic_params = {
-                "location": location_name,
-                "ip_configurations": [ip_config]
-            }
-            network_interface = network_client.network_interfaces.begin_create_or_update(resource_group_name,
-                                                                                         nic_name,
-                                                                                         nic_params).result()
-
-            # Step 5: Create the instance          
+        # Step 3: one virtual network and subnet per user, shared by the nodes of the user
+        vnet_name = "vnet-{}".format(user_name)
+        subnet_name = "subnet-{}".format(user_name)
+
+        def create_subnet():
             try:
-                tags = { 'node_name': node_name, 'user': user_name }
-                node = self.driver.create_node(name=node_name,
-                                               size=size,
-                                               image=image,
-                                               auth=auth,
-                                               location=location,
-                                               ex_resource_group=resource_group_name,
-                                               ex_nic=network_interface,
-                                               ex_use_managed_disks=True,
-                                               ex_tags = tags)
-            except Exception as ex:
-                logging.info("Failed to create %s. Reason: %s" % (node_name, str(ex)))
-
-            node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-            creation_time_str = node.extra.get('properties')['timeCreated']
-            nodes[node_name] = [str(node.id), node_type, creation_time_str]
+                return self.network_client.subnets.get(resource_group_name, vnet_name, subnet_name)
+            except ResourceNotFoundError:
+                vnet = VirtualNetwork(location=location_name,
+                                      address_space=AddressSpace(address_prefixes=["10.0.0.0/16"]),
+                                      subnets=[Subnet(name=subnet_name, address_prefix="10.0.0.0/24")])
+                self.network_client.virtual_networks.begin_create_or_update(resource_group_name, vnet_name, vnet).result()
+                return self.network_client.subnets.get(resource_group_name, vnet_name, subnet_name)
+
+        def create_public_ip(node_name):
+            public_ip = PublicIPAddress(location=location_name, public_ip_allocation_method='Dynamic')
+            return self.network_client.public_ip_addresses.begin_create_or_update(
+                resource_group_name, f'my_public_ip-{user_name}-{node_name}', public_ip)
+
+        # Step 4: Create a network interface
+        def create_nic(node_name, subnet, public_ip):
+            ip_config = NetworkInterfaceIPConfiguration(name="ipconfig1", subnet=Subnet(id=subnet.id),
+                                                        public_ip_address=PublicIPAddress(id=public_ip.id))
+            nic = NetworkInterface(location=location_name, ip_configurations=[ip_config])
+            return self.network_client.network_interfaces.begin_create_or_update(
+                resource_group_name, f"my-nic-{user_name}-{node_name}", nic)
+
+        # Step 5: Create the instance          
+        def create_vm(node_name, nic):
+            tags = { 'node_name': node_name, 'user': user_name }
+            ssh_key = SshPublicKey(path=f"/home/{admin_user}/.ssh/authorized_keys", key_data=self.public_key)
+            vm = VirtualMachine(
+                location=location_name,
+                tags=tags,
+                hardware_profile=HardwareProfile(vm_size=size_name),
+                storage_profile=StorageProfile(
+                    image_reference=ImageReference(publisher=publisher, offer=offer, sku=sku, version=version),
+                    os_disk=OSDisk(create_option='FromImage', delete_option='Delete',
+                                   managed_disk=ManagedDiskParameters(storage_account_type='Standard_LRS'))),
+                os_profile=OSProfile(computer_name=node_name, admin_username=admin_user,
+                                     linux_configuration=LinuxConfiguration(disable_password_authentication=True,
+                                                                            ssh=SshConfiguration(public_keys=[ssh_key]))),
+                network_profile=NetworkProfile(network_interfaces=[NetworkInterfaceReference(id=nic.id, primary=True)]))
+            return self.compute_client.virtual_machines.begin_create_or_update(resource_group_name, node_name, vm)
+
+        # the subnet and the public IPs are created at the same time, each NIC as soon as its IP and the subnet exist,
+        # each VM as soon as its NIC exists
+        pipeline = ProvisioningPipeline(max_workers=min(32, 1 + 3*len(node_names)))
+        pipeline.add('subnet', create_subnet)
+        for node_name in node_names:
+            pipeline.add(('ip', node_name), lambda node_name=node_name: create_public_ip(node_name))
+            pipeline.add(('nic', node_name), lambda subnet, public_ip, node_name=node_name: create_nic(node_name, subnet, public_ip),
+                         depends=['subnet', ('ip', node_name)])
+            pipeline.add(('vm', node_name), lambda nic, node_name=node_name: create_vm(node_name, nic),
+                         depends=[('nic', node_name)])
+        results = pipeline.wait([('vm', node_name) for node_name in node_names])
+        self.invalidate_inventory()
+
+        # the public IPs are assigned once the VMs run: one call for those of the resource group
+        public_ips = self.get_public_ips(resource_group_name)
+        for node_name in node_names:
+            vm = results[('vm', node_name)]
+            if isinstance(vm, Exception):
+                print(Fore.RED + f"\nFailed to create {node_name}. Reason: {vm}" + Fore.RESET)
+                continue
+
+            node_type = vm_size(vm)
+            creation_time_str = vm.time_created.isoformat() if vm.time_created is not None else None
+            nodes[node_name] = [str(vm.id), node_type, creation_time_str]
+            self.index_job(node_name, vm.id, public_ips.get(vm_nic_id(vm)), node_type, creation_time_str, walltime)
 
             print(f"\nCreated instance: {node_name}")
 
             # ssh to the node and execute a shutdown command scheduled for walltime
             '''
-            host = node.public_ips[0]
+            host = public_ips.get(vm_nic_id(vm))
             user_name = os.environ['USER']
             print("Connecting to host: " + host)          
             cmd = f"ssh -o StrictHostKeyChecking=accept-new {user_name}@{host} -t 'sudo shutdown -P {walltime_in_minutes}' "
@@ -291,100 +367,133 @@ class AZURE(Cloud):
     def destroy_nodes(self, node_names, need_confirmation=True):
         '''
         Destroy all the nodes given the list of node names
-        NOTE: should store the running cost and time before terminating the node(s)
+        The VMs are deleted at the same time, then the network interface, public IP and OS disk of each node once
+        its VM is gone and the virtual networks left without network interfaces; the running time and cost of the
+        deleted VMs are recorded with one write to the usage history.
         node_names = list of node names as strings
         '''
         if isinstance(node_names, str): node_names = [node_names]
         user_name = os.environ['USER']
 
-        nodes = self.driver.list_nodes()
+        # one filtered request for all the names
+        found = self.lookup_many(names=node_names)
+        end_time = datetime.now(timezone.utc)
+        targets = []
         for name in node_names:
-            #node = self.driver.ex_get_node(name)
-            node = next((nd for nd in nodes if nd.name == name), None)
-            if node is None:
+            item = found.get(name)
+            if item is None:
                 raise ValueError(f"Node {name} not found.")
+            node = item.instance
 
-            node_user_name = self.get_instance_user_name(node)
-            if  node_user_name != user_name:
+            if self.get_instance_user_name(node) != user_name:
                 print(f"Cannot destroy an instance {name} created by other users")
                 continue
 
-            creation_time_str = node.extra.get('properties')['timeCreated']  # Azure
-            
-            # Convert the creation time from string to datetime object
-            # Azure returns 7-digit after '.' for seconds, so need to truncate the last digit 
-            # to cast into %Y-%m-%dT%H:%M:%S.%f%z format
-            idx = creation_time_str.find('+')
-            creation_time_str = creation_time_str[:idx-1] + creation_time_str[idx:]
-            creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-            # Calculate the running time
-            running_time = datetime.now(timezone.utc) - creation_time
-            # get the node type
-            node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-            instance_unit_cost = self.get_unit_price_instance(node)
-            running_cost = running_time.seconds/3600.0 * instance_unit_cost
-
-            if need_confirmation == True:
-                response = input(f"Do you want to destroy {node.name} (running cost ${running_cost:0.5f})? (y/n) ")
-                if response != 'y':
-                    continue
-            # record the running time and cost
-            running_time = datetime.now(timezone.utc) - creation_time
-            running_cost = running_time.seconds/3600.0 * instance_unit_cost
-            usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
-            
-            # store the record into the database
-            data = [node_user_name, node.id, node_type, 
-                    creation_time, datetime.now(timezone.utc), running_cost, remaining_balance]
-            
-            if os.path.isfile(self.usage_history):
-                df = pd.read_pickle(self.usage_history)
+            creation_time = utils.parse_iso(node.time_created)
+            running_time = end_time - creation_time
+            running_cost = running_time.total_seconds()/3600.0 * self.get_unit_price_instance(node)
+            targets.append((name, node, creation_time, running_cost))
+
+        if len(targets) == 0:
+            return
+
+        if need_confirmation == True:
+            if len(targets) == 1:
+                name, node, _, running_cost = targets[0]
+                question = f"Do you want to destroy {name} (running cost ${running_cost:0.5f})? (y/n) "
             else:
-                df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost','Balance'])
+                for name, node, _, running_cost in targets:
+                    print(f"  {name} (running cost ${running_cost:0.5f})")
+                question = f"Do you want to destroy these {len(targets)} nodes? (y/n) "
+            response = input(question)
+            if response != 'y':
+                return
 
-            df = pd.concat([pd.DataFrame([data], columns=df.columns), df], ignore_index=True)
-            df.to_pickle(self.usage_history)
+        def delete_nics(node):
+            # the public IPs and subnets of the network interfaces of a VM, read before the interfaces are deleted
+            ip_ids, subnet_ids, pollers = [], [], []
+            for nic_ref in (node.network_profile.network_interfaces if node.network_profile is not None else None) or []:
+                resource_group, nic_name = resource_names(nic_ref.id)[:2]
+                try:
+                    nic = self.network_client.network_interfaces.get(resource_group, nic_name)
+                except ResourceNotFoundError:
+                    continue
+                for ip_config in nic.ip_configurations or []:
+                    if ip_config.public_ip_address is not None:
+                        ip_ids.append(ip_config.public_ip_address.id)
+                    if ip_config.subnet is not None:
+                        subnet_ids.append(ip_config.subnet.id)
+                pollers.append(self.network_client.network_interfaces.begin_delete(resource_group, nic_name))
+            for poller in pollers:
+                poller.result()
+            return ip_ids, subnet_ids
+
+        def delete_public_ips(name, nics):
+            ip_ids, _ = nics
+            if len(ip_ids) == 0:
+                # the interface is already gone: the IP named as create_nodes does, if any
+                ip_ids = [f"/subscriptions/{self.account['subscription_id']}/resourceGroups/{resource_group_name}"
+                          f"/providers/Microsoft.Network/publicIPAddresses/my_public_ip-{user_name}-{name}"]
+            pollers = [self.network_client.public_ip_addresses.begin_delete(*resource_names(ip_id)[:2]) for ip_id in ip_ids]
+            for poller in pollers:
+                poller.result()
+
+        def delete_vnets(*nics):
+            # the vnet of the user (or of an older node) goes once none of its subnets has a network interface left
+            vnets = set()
+            for _, subnet_ids in nics:
+                vnets.update(tuple(resource_names(subnet_id)[:2]) for subnet_id in subnet_ids)
+            pollers = []
+            for resource_group, vnet_name in vnets:
+                try:
+                    vnet = self.network_client.virtual_networks.get(resource_group, vnet_name)
+                except ResourceNotFoundError:
+                    continue
+                if any(subnet.ip_configurations for subnet in vnet.subnets or []):
+                    continue
+                pollers.append(self.network_client.virtual_networks.begin_delete(resource_group, vnet_name))
+            for poller in pollers:
+                poller.result()
+
+        # order to destroy: VM, then NIC and OS disk, then IP, and the VNETs once all the NICs are gone
+        resource_group_name = self.account['resource_group']
+        pipeline = ProvisioningPipeline(max_workers=min(32, 1 + 4*len(targets)))
+        steps = []
+        for name, node, _, _ in targets:
+            pipeline.add(('vm', name), lambda name=name: self.compute_client.virtual_machines.begin_delete(resource_group_name, name))
+            pipeline.add(('nic', name), lambda _, node=node: delete_nics(node), depends=[('vm', name)])
+            pipeline.add(('ip', name), lambda nics, name=name: delete_public_ips(name, nics), depends=[('nic', name)])
+            steps += [('vm', name), ('nic', name), ('ip', name)]
+
+            # the VMs created by libcloud keep their managed OS disk
+            os_disk = node.storage_profile.os_disk if node.storage_profile is not None else None
+            if os_disk is not None and os_disk.managed_disk is not None and getattr(os_disk.delete_option, 'value', os_disk.delete_option) != 'Delete':
+                disk_group, disk_name = resource_names(os_disk.managed_disk.id)[:2] if os_disk.managed_disk.id else (resource_group_name, os_disk.name)
+                pipeline.add(('disk', name), lambda _, disk_group=disk_group, disk_name=disk_name: self.compute_client.disks.begin_delete(disk_group, disk_name),
+                             depends=[('vm', name)])
+                steps.append(('disk', name))
+        results = pipeline.wait(steps)
+        try:
+            delete_vnets(*[result for (kind, _), result in results.items() if kind == 'nic' and not isinstance(result, Exception)])
+        except Exception as e:
+            print(Fore.RED + f"Failed to delete the virtual network. Reason: {e}" + Fore.RESET)
+        self.invalidate_inventory()
 
-            # order to destroy: VM, IP, NIC, VNET
-            self.driver.destroy_node(node)
-
-            # there might be resources leftover: IP, NIC and VNET
-            subscription_id = self.account['subscription_id']
-            resource_client = ResourceManagementClient(self.credentials, subscription_id)
-
-            resource_group_name = self.account['resource_group']
-            public_ip_name = "my_public_ip-{}-{}".format(user_name, name)
-            nic_name = "my-nic-{}".format(user_name, name)
-            vnet_name = "vnet-{}-{}".format(user_name, name)
-
-            # 2022-11-01 is the API version, may change
-            API_VERSION = "2022-11-01"
-            ip_delete = resource_client.resources.begin_delete_by_id(
-                                "/subscriptions/{}/resourceGroups/{}/providers/{}/{}/{}".format(
-                                subscription_id,
-                                resource_group_name,
-                                "Microsoft.Network",
-                                "publicIPAddresses",
-                                public_ip_name), API_VERSION)
-            ip_delete.wait()
-
-            nic_delete = resource_client.resources.begin_delete_by_id(
-                                "/subscriptions/{}/resourceGroups/{}/providers/{}/{}/{}".format(
-                                subscription_id,
-                                resource_group_name,
-                                "Microsoft.Network",
-                                "networkInterfaces",
-                                nic_name), API_VERSION)
-            nic_delete.wait()
-
-            vnet_delete = resource_client.resources.begin_delete_by_id(
-                                "/subscriptions/{}/resourceGroups/{}/providers/{}/{}/{}".format(
-                                subscription_id,
-                                resource_group_name,
-                                "Microsoft.Network",
-                                "virtualNetworks",
-                                vnet_name), API_VERSION)
-            vnet_delete.wait()
+        # record the running time and cost of the deleted VMs, each row with the balance left before its VM
+        usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
+        rows = []
+        for name, node, creation_time, running_cost in targets:
+            if isinstance(results[('vm', name)], Exception):
+                print(Fore.RED + f"Failed to destroy {name}. Reason: {results[('vm', name)]}" + Fore.RESET)
+                continue
+            rows.append([user_name, node.id, vm_size(node), creation_time, end_time, running_cost, remaining_balance])
+            remaining_balance -= running_cost
+            for kind in ['nic', 'ip', 'disk']:
+                error = results.get((kind, name))
+                if isinstance(error, Exception):
+                    print(Fore.RED + f"Failed to delete the {kind.upper()} of {name}. Reason: {error}" + Fore.RESET)
+        self.record_usage(rows)
+        self.job_index.remove(ids=[row[1] for row in rows])
 
     def check_valid_user(self, user_name, verbose=False):
         if user_name not in self.users:
@@ -428,6 +537,7 @@ class AZURE(Cloud):
         compute the accumulating cost from the pkl database
         and the remaining balance
         '''
+        import pandas as pd
         if user_name not in self.users:
             raise Exception(f"{user_name} is not listed in the user group of this account.")
                 
@@ -453,23 +563,7 @@ class AZURE(Cloud):
         """
         List all the node (instance) types provided by the vendor and their unit prices
         """
-        node_info = []
-        for node_type in self.vendor['node-types']:
-            if 'gpu' in self.vendor['node-types'][node_type]:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              self.vendor['node-types'][node_type]['gpu'],
-                              self.vendor['node-types'][node_type]['gpu-type'],
-                              self.vendor['node-types'][node_type]['price']])
-            else:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              "0",
-                              "--",
-                              self.vendor['node-types'][node_type]['price']])
-        print(tabulate(node_info, headers=['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost ($)']))
+        print(tabulate(self.catalog.rows(), headers=NodeTypeCatalog.headers))
         print("")
 
     def get_group_members(self):
@@ -491,26 +585,10 @@ class AZURE(Cloud):
         """
         nodes = []
         current_time = datetime.now(timezone.utc)
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                # Get the creation time of the instance
-                creation_time_str = node.extra.get('properties')['timeCreated']  # Azure
-                if creation_time_str:
-                    # Convert the creation time from string to datetime object
-                    # Azure returns 7-digit after '.' for seconds, so need to truncate the last digit 
-                    # to cast into %Y-%m-%dT%H:%M:%S.%f%z format
-                    idx = creation_time_str.find('+')
-                    creation_time_str = creation_time_str[:idx-1] + creation_time_str[idx:]
-
-                    creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-                    
-                    # Calculate the running time
-                    running_time = current_time - creation_time
-
-                    # get the node type
-                    node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-
-                    nodes.append([node.name, node.state, node_type, node.id, running_time])
+        running = [item for item in self.get_inventory() if item.state == "running"]
+        for record in self.node_records(running, show_protected_nodes=True):
+            if record.launch_time is not None:
+                nodes.append([record.name, record.state, record.instance_type, record.id, record.elapsed(current_time)])
 
         if verbose == True:
             print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Running Time']))
@@ -520,23 +598,97 @@ class AZURE(Cloud):
         """
         Get the per-hour price of an instance depending on its instance_type (e.g. t2.micro) from the cloud.yaml file
         """
-        for node_type in self.vendor['node-types']:
-            vmtype = node.extra.get('properties')['hardwareProfile']['vmSize']
-            if self.vendor['node-types'][node_type]['name'] == vmtype:
-                instance_type = self.vendor['node-types'][node_type]['name']
-                unit_price = self.vendor['node-types'][node_type]['price']
-                return unit_price
+        return self.catalog.instance_price(vm_size(node))
 
     def get_unit_price(self, node_type: str):
         """
         Get the per-hour price of an instance depending on its instance_type (e.g. t1) from the cloud.yaml file
         """
-        if node_type in self.vendor['node-types']:
-            return self.vendor['node-types'][node_type]['price']
-        return -1.0
+        return self.catalog.price(node_type)
 
     def get_host_ip(self, node_name):
-        pass
+        item = self.lookup_job(name=node_name)
+        if item is None:
+            raise ValueError(f"Node {node_name} not found.")
+        return item.ip
+
+    def inventory_item(self, vm, public_ips):
+        return InventoryItem(vm.name,
+                             vm.id,
+                             public_ips.get(vm_nic_id(vm)),
+                             self.get_instance_user_name(vm),
+                             vm_state(vm),
+                             vm)
+
+    def get_public_ips(self, resource_group=None):
+        """
+        The public IP addresses of the subscription (or of a resource group) with one paged call:
+        return a dict network interface ID (lower case) -> IP address
+        """
+        if resource_group is None:
+            addresses = self.network_client.public_ip_addresses.list_all()
+        else:
+            addresses = self.network_client.public_ip_addresses.list(resource_group)
+        public_ips = {}
+        for address in addresses:
+            if address.ip_address and address.ip_configuration is not None:
+                nic_id = address.ip_configuration.id.lower().split('/ipconfigurations/')[0]
+                public_ips.setdefault(nic_id, address.ip_address)
+        return public_ips
+
+    def iter_instances(self):
+        """
+        Yield the VMs of the subscription with their instance view (power state) page by page
+        """
+        return iter(self.compute_client.virtual_machines.list_all(expand='instanceView'))
+
+    def iter_inventory(self):
+        """
+        List all the VMs of the subscription with one paged call, after their public IPs with another one
+        """
+        public_ips = self.get_public_ips()
+        for vm in self.iter_instances():
+            yield self.inventory_item(vm, public_ips)
+
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        """
+        List the VMs with the given names or IDs, owner and states:
+        the VMs of the resource group are selected by their tags (user, node_name) with one filtered call,
+        then only those are fetched
+        """
+        if ids is not None:
+            node_ids = list(ids)
+        else:
+            # Azure filters on one tag value per call, several names are matched here
+            if owner is not None:
+                query = f"tagName eq 'user' and tagValue eq '{owner}'"
+            elif names is not None and len(names) == 1:
+                query = f"tagName eq 'node_name' and tagValue eq '{names[0]}'"
+            else:
+                query = "resourceType eq 'Microsoft.Compute/virtualMachines'"
+            resource_client = ResourceManagementClient(self.credentials, self.account['subscription_id'])
+            resources = resource_client.resources.list_by_resource_group(self.account['resource_group'], filter=query)
+            node_ids = [resource.id for resource in resources
+                        if resource.type == 'Microsoft.Compute/virtualMachines' and (names is None or resource.name in names)]
+        if len(node_ids) == 0:
+            return []
+
+        vms = []
+        for node_id in node_ids:
+            # /subscriptions/<id>/resourceGroups/<group>/providers/Microsoft.Compute/virtualMachines/<name>
+            fields = node_id.split('/')
+            try:
+                vms.append(self.compute_client.virtual_machines.get(fields[4], fields[-1], expand='instanceView'))
+            except ResourceNotFoundError:
+                continue
+
+        public_ips = self.get_public_ips(self.account['resource_group'])
+        items = []
+        for vm in vms:
+            item = self.inventory_item(vm, public_ips)
+            if (owner is None or item.owner == owner) and (states is None or item.state in states):
+                items.append(item)
+        return items
 
     def get_instance_name(self, node):
         """Member function: get_instance_name
@@ -552,7 +704,7 @@ class AZURE(Cloud):
         '''
         return the user name that created the node
         '''
-        return node.extra.get('tags', {}).get('user')
+        return (node.tags or {}).get('user')
 
     def get_running_cost(self, verbose=True):
 
@@ -560,32 +712,13 @@ class AZURE(Cloud):
 
         nodes = []
         total_cost = 0.0
-        for node in self.driver.list_nodes():
-            if self.get_instance_name(node) in self.account['protected_nodes']:
+        running = [item for item in self.get_inventory() if item.state == "running"]
+        for record in self.node_records(running):
+            if record.launch_time is None:
                 continue
-            if node.state == "running":
-                # Get the creation time of the instance
-                creation_time_str = node.extra.get('properties')['timeCreated']  # Azure
-                if creation_time_str:
-                    # Convert the creation time from string to datetime object
-                    # Azure returns 7-digit after '.' for seconds, so need to truncate the last digit 
-                    # to cast into %Y-%m-%dT%H:%M:%S.%f%z format
-                    idx = creation_time_str.find('+')
-                    creation_time_str = creation_time_str[:idx-1] + creation_time_str[idx:]
-
-                    creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-                    
-                    # Calculate the running time
-                    running_time = current_time - creation_time
-
-                    # get the node type
-                    node_type = node.extra.get('properties')['hardwareProfile']['vmSize']
-
-                    instance_unit_cost = self.get_unit_price_instance(node)
-                    running_cost = running_time.seconds/3600.0 * instance_unit_cost
-                    total_cost = total_cost + running_cost
-
-                    nodes.append([node.name, node_type, running_time, running_cost])
+            running_cost = record.cost(current_time)
+            total_cost = total_cost + running_cost
+            nodes.append([record.name, record.instance_type, record.elapsed(current_time), running_cost])
 
         if verbose == True:
             print(tabulate(nodes, headers=['Name', 'Type', 'Running Time', 'Running Cost']))
@@ -3,13 +3,301 @@
 
 # Maintainer: Yuxing Peng, Trung Nguyen
 
+from array import array
+from datetime import datetime, timezone
+import math
 import os
+import time
 from tabulate import tabulate
 from .. import utils
+from ..jobindex import JobIndex, DEFAULT_TTL as DEFAULT_JOB_TTL
+
+class NodeType():
+    '''
+    a node type listed under node-types in cloud.yaml, e.g. t1: { name: t2.micro, price: 0.0116, cores: 1, memgb: 1 }
+    '''
+    __slots__ = ('alias', 'name', 'price', 'cores', 'memgb', 'gpu', 'gpu_type', 'cfg')
+
+    def __init__(self, alias: str, cfg: dict):
+        self.alias = alias
+        self.name = cfg['name']
+        self.price = cfg['price']
+        self.cores = cfg.get('cores')
+        self.memgb = cfg.get('memgb')
+        self.gpu = cfg.get('gpu')
+        self.gpu_type = cfg.get('gpu-type')
+        self.cfg = cfg
+
+    def row(self):
+        '''
+        the row printed by get_node_types()
+        '''
+        if self.gpu is not None:
+            return [self.alias, self.name, self.cores, self.memgb, self.gpu, self.gpu_type, self.price]
+        return [self.alias, self.name, self.cores, self.memgb, "0", "--", self.price]
+
+class NodeTypeCatalog():
+    '''
+    the node types of a vendor indexed by the skyway alias (t1, c36, g1)
+    and by the instance type of the vendor (t2.micro, n1-standard-8, Standard_NC6s_A100_v3),
+    built once when the provider is constructed so that pricing a listed instance is a dict lookup
+    '''
+    headers = ['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost ($)']
+
+    def __init__(self, node_types: dict):
+        self.by_alias = {}
+        self.by_name = {}
+        for alias, node_cfg in node_types.items():
+            node_type = NodeType(alias, node_cfg)
+            self.by_alias[alias] = node_type
+            # if several aliases share an instance type, the first one listed in cloud.yaml wins
+            self.by_name.setdefault(node_type.name, node_type)
+
+    def __contains__(self, alias):
+        return alias in self.by_alias
+
+    def __getitem__(self, alias):
+        return self.by_alias[alias]
+
+    def __iter__(self):
+        return iter(self.by_alias.values())
+
+    def __len__(self):
+        return len(self.by_alias)
+
+    def get(self, alias, default=None):
+        return self.by_alias.get(alias, default)
+
+    def find(self, instance_type, default=None):
+        '''
+        get the node type from the instance type of the vendor
+        '''
+        return self.by_name.get(instance_type, default)
+
+    def price(self, alias, default=-1.0):
+        node_type = self.by_alias.get(alias)
+        return node_type.price if node_type is not None else default
+
+    def instance_price(self, instance_type, default=-1.0):
+        node_type = self.by_name.get(instance_type)
+        return node_type.price if node_type is not None else default
+
+    def rows(self):
+        return [node_type.row() for node_type in self.by_alias.values()]
+
+class InventoryItem():
+    '''
+    an instance (or a job for SLURM) of the account as returned by one list call,
+    instance is the object of the vendor SDK (boto3 Instance, libcloud Node, OCI Instance, SLURMJob)
+    '''
+    __slots__ = ('name', 'id', 'ip', 'owner', 'state', 'instance')
+
+    def __init__(self, name, id, ip, owner, state, instance=None):
+        self.name = name
+        self.id = id
+        self.ip = ip
+        self.owner = owner
+        self.state = state
+        self.instance = instance
+
+class InventorySnapshot():
+    '''
+    the instances of an account from one list call, indexed by ID and by name;
+    the snapshot is never modified, a new one is taken when it expires or after nodes are created or destroyed.
+    A snapshot that is not complete holds only the instances returned by filtered lookups.
+    '''
+    def __init__(self, items, complete=True, taken=None):
+        self.items = tuple(items)
+        self.complete = complete
+        self.taken = time.time() if taken is None else taken
+        self.by_id = {item.id: item for item in self.items}
+        self.by_name = {}
+        for item in self.items:
+            self.by_name.setdefault(item.name, []).append(item)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def age(self):
+        return time.time() - self.taken
+
+    def instances(self, states=None):
+        '''
+        the SDK objects of the instances, optionally only those in the given states
+        '''
+        return [item.instance for item in self.items if states is None or item.state in states]
+
+    def get(self, instance_id, states=None):
+        item = self.by_id.get(instance_id)
+        if item is not None and (states is None or item.state in states):
+            return item
+        return None
+
+    def find(self, name, states=None):
+        '''
+        the first instance with the given name (names are not unique on all vendors)
+        '''
+        for item in self.by_name.get(name, []):
+            if states is None or item.state in states:
+                return item
+        return None
+
+    def merge(self, items):
+        '''
+        a new snapshot with the given items added, replacing those with the same ID
+        '''
+        ids = set(item.id for item in items)
+        kept = [item for item in self.items if item.id not in ids]
+        return InventorySnapshot(kept + list(items), complete=self.complete, taken=self.taken)
+
+class NodeRecord():
+    '''
+    a listed node (instance, VM or job) with the same fields on all the vendors:
+    launch_time is a datetime in UTC (None if unknown) and unit_price the price per hour
+    '''
+    __slots__ = ('name', 'user', 'state', 'instance_type', 'id', 'host', 'launch_time', 'unit_price')
+
+    # columns of row()
+    headers = ['Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']
+
+    def __init__(self, name, user, state, instance_type, id, host, launch_time, unit_price):
+        self.name = name
+        self.user = user
+        self.state = state
+        self.instance_type = instance_type
+        self.id = id
+        self.host = host
+        self.launch_time = launch_time
+        self.unit_price = unit_price
+
+    def elapsed(self, now=None):
+        if self.launch_time is None:
+            return None
+        if now is None:
+            now = datetime.now(timezone.utc)
+        return now - self.launch_time
+
+    def cost(self, now=None):
+        elapsed = self.elapsed(now)
+        if elapsed is None:
+            return 0.0
+        return elapsed.total_seconds()/3600.0 * self.unit_price
+
+    def row(self, now=None):
+        '''
+        the row of list_nodes(), see headers
+        '''
+        if now is None:
+            now = datetime.now(timezone.utc)
+        return [self.name, self.user, self.state, self.instance_type, self.id, self.host,
+                self.elapsed(now), self.cost(now)]
+
+class NodeTable():
+    '''
+    NodeRecords kept by column: lists for the strings, arrays of doubles for the launch times (POSIX seconds, nan if unknown)
+    and the unit prices, which pandas and Arrow take without converting one cell at a time
+    '''
+    columns = NodeRecord.__slots__
+
+    def __init__(self, records=()):
+        self.name = []
+        self.user = []
+        self.state = []
+        self.instance_type = []
+        self.id = []
+        self.host = []
+        self.launch_time = array('d')
+        self.unit_price = array('d')
+        for record in records:
+            self.append(record)
+
+    def append(self, record):
+        self.name.append(record.name)
+        self.user.append(record.user)
+        self.state.append(record.state)
+        self.instance_type.append(record.instance_type)
+        self.id.append(record.id)
+        self.host.append(record.host)
+        self.launch_time.append(math.nan if record.launch_time is None else record.launch_time.timestamp())
+        self.unit_price.append(record.unit_price)
+
+    def __len__(self):
+        return len(self.name)
+
+    def __getitem__(self, i):
+        launch_time = self.launch_time[i]
+        return NodeRecord(self.name[i], self.user[i], self.state[i], self.instance_type[i], self.id[i], self.host[i],
+                          None if math.isnan(launch_time) else datetime.fromtimestamp(launch_time, timezone.utc),
+                          self.unit_price[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self, now=None):
+        '''
+        the rows of list_nodes()
+        '''
+        if now is None:
+            now = datetime.now(timezone.utc)
+        return [record.row(now) for record in self]
+
+    def _columns(self, now):
+        import numpy as np
+        launch_time = np.frombuffer(self.launch_time, dtype=np.float64)
+        unit_price = np.frombuffer(self.unit_price, dtype=np.float64)
+        elapsed = now.timestamp() - launch_time
+        # nan (unknown launch time) becomes NaT
+        launch_us = np.where(np.isnan(launch_time), np.iinfo(np.int64).min, launch_time * 1e6).astype(np.int64)
+        elapsed_us = np.where(np.isnan(elapsed), np.iinfo(np.int64).min, elapsed * 1e6).astype(np.int64)
+        return {'name': self.name, 'user': self.user, 'state': self.state, 'instance_type': self.instance_type,
+                'id': self.id, 'host': self.host,
+                'launch_time': launch_us.view('datetime64[us]'), 'unit_price': unit_price,
+                'elapsed_time': elapsed_us.view('timedelta64[us]'),
+                'running_cost': np.nan_to_num(elapsed / 3600.0 * unit_price)}
+
+    def to_pandas(self, now=None):
+        '''
+        a DataFrame with the columns of NodeRecord plus elapsed_time and running_cost at [now]
+        '''
+        import pandas as pd
+        if now is None:
+            now = datetime.now(timezone.utc)
+        df = pd.DataFrame(self._columns(now))
+        df['launch_time'] = df['launch_time'].dt.tz_localize('UTC')
+        return df
+
+    def to_arrow(self, now=None):
+        '''
+        a pyarrow Table with the columns of to_pandas()
+        '''
+        import pyarrow as pa
+        if now is None:
+            now = datetime.now(timezone.utc)
+        columns = self._columns(now)
+        columns['launch_time'] = pa.array(columns['launch_time'], type=pa.timestamp('us', tz='UTC'))
+        return pa.table(columns)
 
 # Provide the API for child classes to override
 
 class Cloud():
+
+    # cache of the locations, sizes and images of the account (a skyway.metadata.MetadataCache)
+    metadata = None
+
+    # columns of the rows of list_nodes()
+    node_headers = NodeRecord.headers
+
+    # the last InventorySnapshot of the account, reused by the lookups for inventory_ttl seconds
+    inventory = None
+    inventory_ttl = 30
+
+    # states of a running instance, the jobs in these states are kept in the local job index
+    running_states = ['running']
+    _job_index = None
     
     def __init__(self, vendor_cfg, kwargs):
         self.vendor = vendor_cfg
@@ -33,6 +321,133 @@ class Cloud():
         '''
         pass
 
+    def refresh_metadata(self, kind=None):
+        '''
+        list the locations, sizes, subnetworks and images of the account again on next use
+        '''
+        if self.metadata is not None:
+            self.metadata.refresh(kind)
+
+    def iter_inventory(self):
+        '''
+        yield the instances of the account as InventoryItem, page by page as the cloud API returns them
+        '''
+        return iter([])
+
+    def list_inventory(self):
+        '''
+        list the instances of the account with a single (paginated) call, return a list of InventoryItem
+        '''
+        return list(self.iter_inventory())
+
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        '''
+        list the instances with the given names or IDs, owner and states, return a list of InventoryItem;
+        providers override this to filter on the server, so that a lookup does not page through the whole account
+        '''
+        return [item for item in self.list_inventory()
+                if (names is None or item.name in names) and (ids is None or item.id in ids)
+                and (owner is None or item.owner == owner) and (states is None or item.state in states)]
+
+    def get_inventory(self, ttl=None):
+        '''
+        return the inventory snapshot of the account, taking a new one if it is older than ttl seconds
+        '''
+        if ttl is None:
+            ttl = self.inventory_ttl
+        if self.inventory is None or not self.inventory.complete or self.inventory.age() > ttl:
+            self.inventory = InventorySnapshot(self.list_inventory())
+            # a complete listing drops the jobs of the index that are no longer running
+            self.job_index.sync(item.id for item in self.inventory if item.state in self.running_states)
+        return self.inventory
+
+    def invalidate_inventory(self):
+        '''
+        drop the inventory snapshot, called after creating or destroying nodes
+        '''
+        self.inventory = None
+
+    def lookup_many(self, names=None, ids=None, states=None):
+        '''
+        find instances by name or by ID, return a dict name (or ID) -> InventoryItem without the ones not found;
+        those missing from the current snapshot are asked for with a single filtered request
+        and added to the snapshot for the lookups that follow
+        '''
+        by_id = ids is not None
+        keys = list(ids if by_id else names)
+        found = {}
+        snapshot = self.inventory
+        if snapshot is not None and snapshot.age() > self.inventory_ttl:
+            snapshot = None
+        if snapshot is not None:
+            for key in keys:
+                item = snapshot.get(key, states) if by_id else snapshot.find(key, states)
+                if item is not None:
+                    found[key] = item
+
+        missing = [key for key in keys if key not in found]
+        if len(missing) > 0:
+            if by_id:
+                items = self.find_instances(ids=missing, states=states)
+            else:
+                items = self.find_instances(names=missing, states=states)
+            for item in items:
+                found.setdefault(item.id if by_id else item.name, item)
+            if snapshot is not None:
+                self.inventory = snapshot.merge(items)
+            else:
+                self.inventory = InventorySnapshot(items, complete=False)
+        return found
+
+    def lookup(self, name=None, instance_id=None, states=None):
+        '''
+        find an instance by ID or by name, in the inventory snapshot or else with a filtered request
+        '''
+        if instance_id is not None:
+            return self.lookup_many(ids=[instance_id], states=states).get(instance_id)
+        return self.lookup_many(names=[name], states=states).get(name)
+
+    @property
+    def job_index(self):
+        '''
+        the local index of the jobs created by the user under the account (a skyway.jobindex.JobIndex)
+        '''
+        if self._job_index is None:
+            self._job_index = JobIndex(self.account_name, ttl=self.account.get('job_index_ttl', DEFAULT_JOB_TTL))
+        return self._job_index
+
+    def index_job(self, name, instance_id, host, instance_type, launch_time=None, walltime=None):
+        '''
+        add a node just created to the job index, so that connecting to it needs no listing
+        '''
+        self.job_index.add(name, instance_id, host, instance_type, launch_time, walltime)
+
+    def lookup_job(self, name=None, instance_id=None):
+        '''
+        find a running instance by job name or by ID in the job index, else with lookup(), which updates the index:
+        a job the cloud API no longer lists as running is removed, one of the user missing from the index is added.
+        The item from the index has no SDK instance object (only name, id, ip, owner and state).
+        '''
+        user_name = os.environ['USER']
+        if instance_id is not None:
+            indexed_name, entry = self.job_index.find(str(instance_id))
+        else:
+            indexed_name, entry = name, self.job_index.get(name)
+        if entry is not None:
+            return InventoryItem(indexed_name, entry['id'], entry['host'], user_name, self.running_states[0])
+
+        item = self.lookup(name=name, instance_id=instance_id, states=self.running_states)
+        if item is None:
+            if instance_id is not None:
+                self.job_index.remove(ids=[instance_id])
+            else:
+                self.job_index.remove(names=[name])
+        elif item.owner == user_name:
+            record = self.node_record(item)
+            if record is not None:
+                self.index_job(item.name, item.id, item.ip, record.instance_type, record.launch_time)
+        return item
+
     def get_group_members(self):
         '''
         get all the user names in this account (listed in the .yaml file)
@@ -66,13 +481,66 @@ class Cloud():
         remaining_balance = 0
         return accumulating_cost, remaining_balance
 
+    def record_usage(self, rows):
+        '''
+        append the records [user, instance ID, instance type, start, end, cost, balance] of terminated instances
+        to the usage history (pkl database) with a single write, the latest record first
+        '''
+        import pandas as pd
+        if len(rows) == 0:
+            return
+
+        if os.path.isfile(self.usage_history):
+            df = pd.read_pickle(self.usage_history)
+        else:
+            df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost', 'Balance'])
+
+        df = pd.concat([pd.DataFrame(rows[::-1], columns=df.columns), df], ignore_index=True)
+        df.to_pickle(self.usage_history)
+
     # instance operations
 
+    def node_record(self, item):
+        '''
+        the NodeRecord of an InventoryItem, None if the instance is not listed (e.g. terminated)
+        '''
+        return None
+
+    def node_records(self, items, show_protected_nodes=False):
+        '''
+        yield the NodeRecords of InventoryItems, leaving out the protected nodes of the account
+        '''
+        protected = [] if show_protected_nodes else self.account.get('protected_nodes', [])
+        for item in items:
+            if item.name in protected:
+                continue
+            record = self.node_record(item)
+            if record is not None:
+                yield record
+
+    def node_table(self, show_protected_nodes=False):
+        '''
+        list all the running/stopped nodes (aka instances) into a NodeTable
+        '''
+        # a listing is always taken fresh, the lookups that follow reuse it
+        return NodeTable(self.node_records(self.get_inventory(ttl=0), show_protected_nodes))
+
     def list_nodes(self, show_protected_nodes=False, verbose=False):
         '''
-        list all the running/stopped nodes (aka instances)
+        list all the running/stopped nodes (aka instances), return the rows (see node_headers) and an empty string
         '''
-        pass
+        nodes = self.node_table(show_protected_nodes).rows()
+        if verbose == True:
+            print(tabulate(nodes, headers=self.node_headers))
+            print("")
+        return nodes, ''
+
+    def iter_nodes(self, show_protected_nodes=False):
+        '''
+        yield the rows of list_nodes() while the instances are listed page by page, without keeping them
+        '''
+        for record in self.node_records(self.iter_inventory(), show_protected_nodes):
+            yield record.row()
 
     def create_nodes(self, node_type: str, node_names = [], need_confirmation = True, walltime = None):
         '''
@@ -8,18 +8,21 @@
 Documentation for GCP Class
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-import io
 import logging
 import os
+import re
 import subprocess
+import time
 from tabulate import tabulate
 
-from .core import Cloud
+from .core import Cloud, InventoryItem, NodeRecord, NodeTypeCatalog
 from .. import utils
+from ..credentials import CredentialCache
+from ..metadata import DEFAULT_TTL, MetadataCache
 
 from colorama import Fore
-import pandas as pd
 
 # apache-libcloud
 from libcloud.compute.types import Provider
@@ -60,18 +63,25 @@ class GCP(Cloud):
             raise Exception(f'Cloud vendor gcp is undefined.')
       
         self.vendor = vendor_cfg['gcp']
+        self.catalog = NodeTypeCatalog(self.vendor['node-types'])
         self.account_name = account
         self.onpremises = False
 
         ComputeEngine = get_driver(Provider.GCE)
         try:
+            # libcloud keeps the OAuth token in this file and reuses it until it expires
             self.driver = ComputeEngine(self.account['service_account'],
                                         self.keyfile,
-                                        project=self.account['project_id'])
+                                        project=self.account['project_id'],
+                                        credential_file=CredentialCache(account).file('gce'))
         except Exception as e:
             print(f"An error occurred: {e}")
         
         assert(self.driver != False)
+
+        # locations and subnetworks change rarely: list them at most once per metadata_ttl seconds
+        ttl = self.account.get('metadata_ttl', self.vendor.get('metadata_ttl', DEFAULT_TTL))
+        self.metadata = MetadataCache(account, self.vendor['location'], ttl, driver=self.driver)
         return
 
     def check_valid_user(self, user_name, verbose=False):
@@ -116,6 +126,7 @@ class GCP(Cloud):
         compute the accumulating cost from the pkl database
         and the remaining balance
         '''
+        import pandas as pd
         if user_name not in self.users:
             raise Exception(f"{user_name} is not listed in the user group of this account.")
                 
@@ -141,23 +152,7 @@ class GCP(Cloud):
         """
         List all the node (instance) types provided by the vendor and their unit prices
         """
-        node_info = []
-        for node_type in self.vendor['node-types']:
-            if 'gpu' in self.vendor['node-types'][node_type]:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              self.vendor['node-types'][node_type]['gpu'],
-                              self.vendor['node-types'][node_type]['gpu-type'],
-                              self.vendor['node-types'][node_type]['price']])
-            else:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              "0",
-                              "--",
-                              self.vendor['node-types'][node_type]['price']])
-        print(tabulate(node_info, headers=['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost ($)']))
+        print(tabulate(self.catalog.rows(), headers=NodeTypeCatalog.headers))
         print("")
 
     def get_group_members(self):
@@ -170,46 +165,16 @@ class GCP(Cloud):
         print(tabulate(user_info, headers=['User', 'Budget']))
         print("") 
 
-    def list_nodes(self, show_protected_nodes=False, verbose=False):
-        """Member function: list_nodes
-        Get a list of all existed instances
-        
-        Return: a list of multiple turple. Each turple has four elements:
-                (1) instance name (2) state (3) type (4) identifier
+    def node_record(self, item):
+        """Member function: node_record
+        The NodeRecord of a running node, None otherwise
         """
-        nodes = []
-        current_time = datetime.now(timezone.utc)
-        for node in self.driver.list_nodes():
-            if node.state != 'running':
-                continue
-
-            # Get the creation time of the instance
-            creation_time_str = node.extra.get('creationTimestamp')  # GCP
-            if creation_time_str:
-                # Convert the creation time from string to datetime object
-                creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-                
-                # Calculate the running time
-                running_time = current_time - creation_time
+        node = item.instance
+        if node.state != 'running':
+            return None
+        return NodeRecord(item.name, item.owner, item.state, node.size, item.id, item.ip,
+                          utils.parse_iso(node.extra.get('creationTimestamp')), self.get_unit_price_instance(node))
 
-                # Calculate the running cost
-                instance_unit_cost = self.get_unit_price_instance(node)
-                running_cost = running_time.seconds/3600.0 * instance_unit_cost
-
-                node_user_name = self.get_instance_user_name(node)
-
-                nodes.append([node.name, node_user_name, node.state, node.size, node.id, node.public_ips[0], running_time, running_cost])
-
-        output_str = ''
-        if verbose == True:
-            print(tabulate(nodes, headers=['Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']))
-            print("")
-        else:
-            output_str = io.StringIO()
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']), file=output_str)
-            print("", file=output_str)
-        return nodes, output_str
-    
     def create_nodes(self, node_type: str, node_names = [], interactive = False, need_confirmation = True, walltime = None):
         """Member function: create_compute
         Create a group of compute instances(nodes, servers, virtual-machines 
@@ -226,7 +191,7 @@ class GCP(Cloud):
         running_cost = self.get_running_cost(verbose=False)
         usage = usage + running_cost
         remaining_balance = user_budget - usage
-        unit_price = self.vendor['node-types'][node_type]['price']
+        unit_price = self.catalog[node_type].price
         if need_confirmation == True:
             print(f"User budget: ${user_budget:.3f}")
             print(f"+ Usage    : ${usage:.3f}")
@@ -242,14 +207,19 @@ class GCP(Cloud):
 
         print(Fore.BLUE + f"Allocating {count} instance ...", end=" ")
 
-        location_name = self.vendor['location'] + '-c'
-        locations = self.driver.list_locations()
-        location = next((loc for loc in locations if loc.name == location_name), None)
-        if location is None:
-            raise ValueError(f"Location '{location_name}' not found.")
-        
+        # the nodes are created with the compute API of google-cloud-compute (imported only here):
+        # all the inserts are sent first, then the zone operations are awaited together
+        from google.cloud import compute_v1
+        from google.oauth2 import service_account
+
+        project = self.account['project_id']
+        zone = self.vendor['location'] + '-c'
+        credentials = service_account.Credentials.from_service_account_file(
+            self.keyfile, scopes=['https://www.googleapis.com/auth/cloud-platform'])
+        instances_client = compute_v1.InstancesClient(credentials=credentials)
+
         nodes = {}
-        node_cfg = self.vendor['node-types'][node_type]
+        node_cfg = self.catalog[node_type].cfg
         #print(f"node_type = {node_type}: {node_cfg}")
         preemptible = node_cfg['preemptible'] if 'preemptible' in node_cfg else False
 
@@ -262,8 +232,11 @@ class GCP(Cloud):
             'https://www.googleapis.com/auth/trace.append'
         ]
         network = 'vpc1'      # get this from ex_list_networks()
-        subnets = self.driver.ex_list_subnetworks()
-        subnet = next((sub for sub in subnets if sub.name == location_name), None)
+        subnets = self.metadata.get('subnetworks', self.driver.ex_list_subnetworks)
+        subnet = next((sub for sub in subnets if sub.name == zone), None)
+        # the image is looked up once in the project and the public image projects, then kept with the other catalogs
+        image_name = self.account['image_name']
+        source_image = self.metadata.get('image:' + image_name, lambda: self.driver.ex_get_image(image_name).extra['selfLink'])
 
         if walltime is None:
             walltime_str = "00:05:00"
@@ -274,61 +247,95 @@ class GCP(Cloud):
         pt = datetime.strptime(walltime_str, "%H:%M:%S")
         walltime_in_minutes = int(pt.hour * 60 + pt.minute + pt.second/60)
 
-        for node_name in node_names:
-            gpu_type = None
-            gpu_count = None           
+        def instance_resource(node_name):
+            network_interface = compute_v1.NetworkInterface(
+                network=f"projects/{project}/global/networks/{network}",
+                access_configs=[compute_v1.AccessConfig(name='External NAT', type_='ONE_TO_ONE_NAT')])
+            if subnet is not None:
+                network_interface.subnetwork = subnet.extra['selfLink']
+            # google-cloud-compute changed at some point, making tags empty when query the list of nodes with libcloud
+            # instead, we add user and node name to labels when creating nodes
+            instance = compute_v1.Instance(
+                name=node_name,
+                machine_type=f"zones/{zone}/machineTypes/{node_cfg['name']}",
+                labels={'goog-ec-src': 'vm_add-gcloud', 'node_name': node_name, 'user': user_name},
+                disks=[compute_v1.AttachedDisk(boot=True, auto_delete=True,
+                                               initialize_params=compute_v1.AttachedDiskInitializeParams(source_image=source_image))],
+                network_interfaces=[network_interface],
+                service_accounts=[compute_v1.ServiceAccount(email=self.account['service_account'], scopes=scopes)],
+                scheduling=compute_v1.Scheduling(preemptible=preemptible, automatic_restart=not preemptible,
+                                                 on_host_maintenance='TERMINATE'))
             if 'gpu' in node_cfg:
-                gpu_type = node_cfg['gpu-type']
-                gpu_count = node_cfg['gpu']
+                instance.guest_accelerators = [compute_v1.AcceleratorConfig(
+                    accelerator_type=f"projects/{project}/zones/{zone}/acceleratorTypes/{node_cfg['gpu-type']}",
+                    accelerator_count=node_cfg['gpu'])]
+            return instance
 
+        operations = {}
+        failed = {}
+        for node_name in node_names:
             try:
-                # google-cloud-compute changed at some point, making tags empty when query the list of nodes with libcloud
-                tags = [{ 'node_name': node_name, 'user': user_name }]
-                # instead, we add user and node name to labels when creating nodes
-
-                node = self.driver.create_node(node_name,
-                                                size = node_cfg['name'],
-                                                image = self.account['image_name'], 
-                                                location = location,
-                                                ex_network=network,
-                                                ex_subnetwork=subnet,
-                                                ex_service_accounts=[{
-                                                    'email': self.account['service_account'],
-                                                    'scopes': scopes
-                                                }],
-                                                ex_labels={'goog-ec-src': 'vm_add-gcloud', 'node_name': node_name, 'user': user_name},
-                                                ex_preemptible = preemptible,
-                                                ex_accelerator_type = gpu_type,
-                                                ex_accelerator_count = gpu_count,
-                                                ex_on_host_maintenance = 'TERMINATE',
-                                                ex_tags = tags,)
-            except libcloud.common.google.ResourceNotFoundError as e:
-                print(f'Error: Resource not found. Details: {e}')
-            except libcloud.common.google.GoogleBaseError as e:
-                print(f'Google Cloud error occurred: {e}')
+                operations[node_name] = instances_client.insert(project=project, zone=zone,
+                                                                instance_resource=instance_resource(node_name))
             except Exception as e:
-                print(f"Failed to create %s. Reason: %s" % (node_name, str(e)))
+                failed[node_name] = e
+        for node_name, operation in operations.items():
+            try:
+                # the operations run at the same time: waiting on each in turn lasts as long as the slowest one
+                operation.result(timeout=600)
+            except Exception as e:
+                failed[node_name] = e
+
+        # the nodes are then checked together with one filtered listing, more and more rarely, until they all have a public IP
+        created = [node_name for node_name in node_names if node_name not in failed]
+        items = {}
+        delay = 2
+        deadline = time.time() + 300
+        while len(created) > 0:
+            items = {item.name: item for item in self.find_instances(names=created)}
+            if all(node_name in items and items[node_name].state == 'running' and items[node_name].ip
+                   for node_name in created) or time.time() > deadline:
+                break
+            time.sleep(delay)
+            delay = min(2 * delay, 15)
+        self.invalidate_inventory()
+
+        # ssh to the nodes and execute a shutdown command scheduled for walltime, on all the nodes at once
+        ready = [items[node_name] for node_name in created
+                 if node_name in items and items[node_name].state == 'running' and items[node_name].ip]
+        def schedule_shutdown(item):
+            cmd = f"ssh -o StrictHostKeyChecking=accept-new {user_name}@{item.ip} -t 'sudo shutdown -P {walltime_in_minutes}' "
+            return subprocess.run(cmd, shell=True, text=True, capture_output=True)
+
+        results = {}
+        if len(ready) > 0:
+            with ThreadPoolExecutor(max_workers=min(16, len(ready))) as executor:
+                for item, result in zip(ready, executor.map(schedule_shutdown, ready)):
+                    results[item.name] = result
 
-            self.driver.wait_until_running([node])
+        for node_name in node_names:
+            if node_name in failed:
+                print(Fore.RED + f"\nFailed to create {node_name}. Reason: {failed[node_name]}" + Fore.RESET)
+                continue
+            if node_name not in results:
+                state = items[node_name].state if node_name in items else 'not found'
+                print(Fore.RED + f"\nInstance {node_name} is not ready (state: {state})" + Fore.RESET)
+                continue
 
             # record node_type, creation time
-            creation_time_str = node.extra.get('creationTimestamp') 
-            node_type = node_cfg['name']
-            nodes[node_name] = [node_type, creation_time_str, node.public_ips[0]]
+            node = items[node_name].instance
+            creation_time_str = node.extra.get('creationTimestamp')
+            nodes[node_name] = [node_cfg['name'], creation_time_str, node.public_ips[0]]
+            self.index_job(node_name, node.id, node.public_ips[0], node_cfg['name'], creation_time_str, walltime_str)
 
             print(f'\nCreated instance: {node.name}')
-
-            # ssh to the node and execute a shutdown command scheduled for walltime
+            if results[node_name].returncode != 0:
+                print(Fore.RED + f"Scheduling the shutdown failed on {node_name}" + Fore.RESET)
             host = node.public_ips[0]
-            user_name = os.environ['USER']
-            #print("Connecting to host: " + host)
-
-            cmd = f"ssh -o StrictHostKeyChecking=accept-new {user_name}@{host} -t 'sudo shutdown -P {walltime_in_minutes}' "
-            p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
             print("To connect to the instance, run:")
             print(f"  ssh -o StrictHostKeyChecking=accept-new {user_name}@{host} or")
             print(f"  skyway_connect --account={self.account_name} {node.name}")
-        
+
         return nodes
 
     def connect_node(self, node_id, separate_terminal=True):
@@ -347,11 +354,8 @@ class GCP(Cloud):
         """
         #node = self.driver.ex_get_node(node_name)
         
-        node = None
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                if node.id == node_id:
-                    break
+        item = self.lookup(instance_id=node_id, states=["running"])
+        node = item.instance if item is not None else None
         if node is not None:
             public_ip = node.public_ips[0]
             username = os.environ['USER']
@@ -374,13 +378,9 @@ class GCP(Cloud):
         return node_info
 
     def get_node_connection_info(self, node_id):
-        node = None
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                if node.id == node_id:
-                    break
-        if node is not None:                
-            public_ip = node.public_ips[0]
+        item = self.lookup_job(instance_id=node_id)
+        if item is not None:
+            public_ip = item.ip
         
         username = self.vendor['username']
         node_info = {
@@ -396,11 +396,8 @@ class GCP(Cloud):
            execute(node_name='your-node', binary="python", arg1="input.txt", arg2="output.txt")
            execute(node_name='your-node', binary="mpirun -np 4 my_app", arg1="input.txt", arg2="output.txt")
         '''
-        node = None
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                if node.id == node_id:
-                    break
+        item = self.lookup(instance_id=node_id, states=["running"])
+        node = item.instance if item is not None else None
         if node is not None:
             host = node.public_ips[0]
             user_name = os.environ['USER']
@@ -420,11 +417,8 @@ class GCP(Cloud):
         '''
         execute all the lines in a script on a compute node
         '''
-        node = None
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                if node.id == node_id:
-                    break
+        item = self.lookup(instance_id=node_id, states=["running"])
+        node = item.instance if item is not None else None
         if node is not None:
             host = node.public_ips[0]
             user_name = os.environ['USER']
@@ -442,53 +436,58 @@ class GCP(Cloud):
         NOTE: should store the running cost and time before terminating the node(s)
         node_names = list of node names as strings
         '''
+        import pandas as pd
         if isinstance(node_names, str): node_names = [node_names]
 
         user_name = os.environ['USER']
 
-        for node in self.driver.list_nodes():
-            if node.state != "running":
+        # one filtered request for all the names
+        found = self.lookup_many(names=node_names, states=["running"])
+        for name in node_names:
+            item = found.get(name)
+            if item is None:
                 continue
+            node = item.instance
 
-            for name in node_names:
-                if node.name == name:
-                    node_user_name = self.get_instance_user_name(node)
-                    if  node_user_name != user_name:
-                        print(f"Cannot destroy an instance {name} created by other users")
-                        continue
-
-                    creation_time_str = node.extra.get('creationTimestamp')  # GCP
-                    # Convert the creation time from string to datetime object
-                    creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
-                    current_time = datetime.now(timezone.utc)
-                    running_time = current_time - creation_time
-                    instance_unit_cost = self.get_unit_price_instance(node)
-                    running_cost = running_time.seconds/3600.0 * instance_unit_cost
-
-                    if need_confirmation == True:
-                        response = input(f"Do you want to destroy {node.name} (running cost ${running_cost})? (y/n) ")
-                        if response != 'y':
-                            continue
-
-                    self.driver.destroy_node(node)
-
-                    # record the running time and cost
-                    running_time = current_time - creation_time
-                    instance_unit_cost = self.get_unit_price_instance(node)
-                    running_cost = running_time.seconds/3600.0 * instance_unit_cost
-                    usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
-
-                    # store the record into the database
-                    data = [node_user_name, node.id, node.size, creation_time, current_time, running_cost, remaining_balance]
+            node_user_name = self.get_instance_user_name(node)
+            if  node_user_name != user_name:
+                print(f"Cannot destroy an instance {name} created by other users")
+                continue
 
-                    if os.path.isfile(self.usage_history):
-                        df = pd.read_pickle(self.usage_history)
-                    else:
-                        df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost', 'Balance'])
+            creation_time_str = node.extra.get('creationTimestamp')  # GCP
+            # Convert the creation time from string to datetime object
+            creation_time = datetime.strptime(creation_time_str, '%Y-%m-%dT%H:%M:%S.%f%z')
+            current_time = datetime.now(timezone.utc)
+            running_time = current_time - creation_time
+            instance_unit_cost = self.get_unit_price_instance(node)
+            running_cost = running_time.seconds/3600.0 * instance_unit_cost
+
+            if need_confirmation == True:
+                response = input(f"Do you want to destroy {node.name} (running cost ${running_cost})? (y/n) ")
+                if response != 'y':
+                    continue
+
+            self.driver.destroy_node(node)
+            self.job_index.remove(ids=[node.id])
+
+            # record the running time and cost
+            running_time = current_time - creation_time
+            instance_unit_cost = self.get_unit_price_instance(node)
+            running_cost = running_time.seconds/3600.0 * instance_unit_cost
+            usage, remaining_balance = self.get_cost_and_usage_from_db(user_name=user_name)
+
+            # store the record into the database
+            data = [node_user_name, node.id, node.size, creation_time, current_time, running_cost, remaining_balance]
+
+            if os.path.isfile(self.usage_history):
+                df = pd.read_pickle(self.usage_history)
+            else:
+                df = pd.DataFrame([], columns=['User','InstanceID','InstanceType','Start','End', 'Cost', 'Balance'])
 
-                    df = pd.concat([pd.DataFrame([data], columns=df.columns), df], ignore_index=True)
-                    df.to_pickle(self.usage_history)
+            df = pd.concat([pd.DataFrame([data], columns=df.columns), df], ignore_index=True)
+            df.to_pickle(self.usage_history)
             
+        self.invalidate_inventory()
         return
    
     def get_running_nodes(self, verbose=False):
@@ -499,7 +498,7 @@ class GCP(Cloud):
         
         current_time = datetime.now(timezone.utc)
 
-        for node in self.driver.list_nodes():
+        for node in self.get_inventory().instances():
             if node.state == "running":
                 # Get the creation time of the instance
                 creation_time_str = node.extra.get('creationTimestamp')  # GCP
@@ -523,23 +522,19 @@ class GCP(Cloud):
         Get the per-hour price of an instance depending on its instance_type (e.g. n1-standard-1)
         For GCE, node.size is the instance type.
         """
-
-        for node_type in self.vendor['node-types']:
-            if self.vendor['node-types'][node_type]['name'] == node.size:
-                unit_price = self.vendor['node-types'][node_type]['price']
-                return unit_price
-        return -1.0
+        return self.catalog.instance_price(node.size)
 
     def get_unit_price(self, node_type: str):
         """
         Get the per-hour price of an instance depending on its instance_type (e.g. t1)
         """
-        if node_type in self.vendor['node-types']:
-            return self.vendor['node-types'][node_type]['price']
-        return -1.0
+        return self.catalog.price(node_type)
 
     def get_host_ip(self, node_name):
-        return self.driver.ex_get_node(node_name).public_ips[0]
+        item = self.lookup_job(name=node_name)
+        if item is None:
+            raise ValueError(f"Node '{node_name}' not found.")
+        return item.ip
 
     def get_instance_user_name(self, node):
         '''
@@ -548,7 +543,7 @@ class GCP(Cloud):
         # some change in the GCP cloud compute that makes tags empty
         #return node.extra.get('tags', {}).get('user')
         # adding user and node name to labels  when creating nodes
-        return node.extra.get('labels').get('user')
+        return (node.extra.get('labels') or {}).get('user')
 
     def get_instance_name(self, node):
         """Member function: get_instance_name
@@ -565,18 +560,81 @@ class GCP(Cloud):
         """Member function: get_instance_ID
 
         """
-        for node in self.driver.list_nodes():
-            if node.state == "running":
-                if node.name == instance_name:
-                    return node.id
-        return ''
+        item = self.lookup_job(name=instance_name)
+        return item.id if item is not None else ''
 
 
     def get_instances(self, filters = []):
         """Member function: get_instances
-        Get a list of instance objects with give filters
+        Get a list of instance objects with give filters,
+        each filter is a GCE filter expression with a regular expression, e.g. '(labels.user eq "alice")'
+        """
+        if len(filters) == 0:
+            return self.driver.list_nodes()
+        return list(self.iter_instances(filters))
+
+    def iter_instances(self, filters = []):
+        """Member function: iter_instances
+        Yield the nodes of the project page by page, with one aggregated request over all the zones per 500 nodes,
+        filtered by GCE with the given filter expressions (see get_instances())
+        """
+        connection = self.driver.connection
+        params = {'maxResults': 500}
+        if len(filters) > 0:
+            params['filter'] = ' '.join(filters)
+            use_disk_cache = False
+        else:
+            # the disks of all the nodes are listed with one call
+            self.driver._ex_populate_volume_dict()
+            use_disk_cache = True
+
+        more_results = True
+        while more_results:
+            connection.gce_params = params
+            response = connection.request('/aggregated/instances', method='GET').object
+            for zone_items in response.get('items', {}).values():
+                for instance in zone_items.get('instances', []):
+                    try:
+                        node = self.driver._to_node(instance, use_disk_cache=use_disk_cache)
+                    except libcloud.common.google.ResourceNotFoundError:
+                        # deleted since it was listed
+                        continue
+                    yield node
+            more_results = 'pageToken' in params
+
+    def inventory_item(self, node):
+        return InventoryItem(node.name,
+                             node.id,
+                             node.public_ips[0] if node.public_ips else None,
+                             self.get_instance_user_name(node),
+                             node.state,
+                             node)
+
+    def iter_inventory(self):
+        """
+        List all the nodes of the project with one (paginated) call
+        """
+        for node in self.iter_instances():
+            yield self.inventory_item(node)
+
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        """
+        List the nodes with the given names or IDs, owner (user label) and states with one filtered call
         """
-        return self.driver.list_nodes()
+        def expression(field, values):
+            return f'({field} eq "{"|".join(re.escape(str(value)) for value in values)}")'
+
+        filters = []
+        if names is not None:
+            filters.append(expression('name', names))
+        if ids is not None:
+            filters.append(expression('id', ids))
+        if owner is not None:
+            filters.append(expression('labels.user', [owner]))
+        if states is not None:
+            # GCE status of the libcloud states, e.g. running -> RUNNING, pending -> PROVISIONING|STAGING|STOPPING
+            filters.append(expression('status', [status for status, state in self.driver.NODE_STATE_MAP.items() if state in states]))
+        return [self.inventory_item(node) for node in self.get_instances(filters)]
 
     def get_running_cost(self, verbose=True):
 
@@ -584,7 +642,7 @@ class GCP(Cloud):
 
         nodes = []
         total_cost = 0.0
-        for node in self.driver.list_nodes():
+        for node in self.get_inventory().instances():
             if self.get_instance_name(node) in self.account['protected_nodes']:
                 continue
             if node.state == "running":
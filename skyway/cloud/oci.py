@@ -7,18 +7,19 @@
 Documentation for OCI Class
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-import io
 import logging
 import os
 import subprocess
+import time
 from tabulate import tabulate
 
-from .core import Cloud
+from .core import Cloud, InventoryItem, NodeRecord, NodeTypeCatalog
 from .. import utils
+from ..metadata import DEFAULT_TTL, MetadataCache
 
 from colorama import Fore
-import pandas as pd
 
 # Oracle Cloud Infrastructure (OCI) Python SDK
 import oci
@@ -27,6 +28,8 @@ class OCI(Cloud):
     """Documentation for AWS Class
     This Class is used as the driver to operate Cloud resource for [Demo]
     """
+
+    running_states = ['RUNNING']
     
     def __init__(self, account):
         """Constructor:
@@ -64,6 +67,7 @@ class OCI(Cloud):
         self.identity_client = oci.identity.IdentityClient(self.config)
         self.compute_client = oci.core.ComputeClient(self.config)
         self.compute_client_composite_operations = oci.core.ComputeClientCompositeOperations(self.compute_client)
+        self.network_client = oci.core.VirtualNetworkClient(self.config)
 
         self.usage_history = f"{account_path}usage-{account}.pkl"
 
@@ -74,58 +78,30 @@ class OCI(Cloud):
             raise Exception(f'Cloud vendor oci is undefined.')
 
         self.vendor = vendor_cfg['oci']
+        self.catalog = NodeTypeCatalog(self.vendor['node-types'])
         self.account_name = account
         self.onpremises = False
 
+        # availability domains and images change rarely: list them at most once per metadata_ttl seconds
+        ttl = self.account.get('metadata_ttl', self.vendor.get('metadata_ttl', DEFAULT_TTL))
+        self.metadata = MetadataCache(account, self.account['region'], ttl)
+
         # copy ssh pem file to ~/, change the permission to 400
         pem_file_full_path = account_path + self.account['private_key']
         self.my_ssh_private_key =  f"~/.my_oci_ssh_key.pem"
         cmd = f"cp {pem_file_full_path} {self.my_ssh_private_key}; chmod 400 {self.my_ssh_private_key}"
         p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
 
-    def list_nodes(self, show_protected_nodes=False, verbose=False):
-        """Member function: list_nodes
-        Get a list of all existed instances
-        
-        Return: a list of multiple turple. Each turple has four elements:
-                (1) instance name (2) state (3) type (4) identifier
+    def node_record(self, item):
+        """Member function: node_record
+        The NodeRecord of an instance, None if terminated
         """
-        
-        
-        instances = self.get_instances()
-        nodes = []
-
-        for instance in instances:
-            node_name = self.get_instance_name(instance)
-            if show_protected_nodes == False and node_name in self.account['protected_nodes']:
-                continue
-
-            if instance.lifecycle_state != 'Terminated':
-                running_time = datetime.now(timezone.utc) - instance.time_created
-                
-                instance_unit_cost = self.get_unit_price_instance(instance)
-                running_cost = running_time.total_seconds()/3600.0 * instance_unit_cost
-
-                public_ip_address = self.get_host_ip(instance)
-                instance_type = instance.shape
-                nodes.append([instance.display_name,
-                              instance.lifecycle_state,
-                              instance_type,
-                              instance.id,
-                              public_ip_address,
-                              running_time,
-                              running_cost])
-        
-        output_str = ''
-        if verbose == True:
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']))
-            print("")
-        else:
-            output_str = io.StringIO()
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']), file=output_str)
-            print("", file=output_str)
-        return nodes, output_str
-
+        instance = item.instance
+        if instance.lifecycle_state == oci.core.models.Instance.LIFECYCLE_STATE_TERMINATED:
+            return None
+        return NodeRecord(item.name, item.owner, item.state, instance.shape, item.id, item.ip,
+                          instance.time_created, self.get_unit_price_instance(instance))
+    
     def create_nodes(self, node_type: str, node_names = [], interactive = False, need_confirmation = True, walltime = None):
         """Member function: create_compute
         Create a group of compute instances(nodes, servers, virtual-machines 
@@ -133,6 +109,8 @@ class OCI(Cloud):
         
          - node_type: instance type information from the Skyway definitions
          - node_names: a list of names for the nodes, to get the number of nodes
+        The instances are all launched before any is waited for, then checked together until they run;
+        a flexible shape gets the cores and memgb of the node type.
         
         Return: a dictionary of instance ID (i.e., names) for created instances.
         """
@@ -142,7 +120,7 @@ class OCI(Cloud):
         running_cost = self.get_running_cost(verbose=False)
         usage = usage + running_cost
         remaining_balance = user_budget - usage
-        unit_price = self.vendor['node-types'][node_type]['price']
+        unit_price = self.catalog[node_type].price
         if need_confirmation == True:
             print(f"User budget: ${user_budget:.3f}")
             print(f"+ Usage    : ${usage:.3f}")
@@ -151,60 +129,72 @@ class OCI(Cloud):
             if response == 'n':
                 return
 
-        count = len(node_names)      
-        node_name = node_names[0]
+        count = len(node_names)
         print(Fore.BLUE + f"Allocating {count} instance ...", end=" ")
 
         # ImageID and KeyName provided by the account then user can connect to the running node
         #   if ImageID is from the vendor, KeyName from the account, ssh connection is denied
 
-        vnic_details = oci.core.models.CreateVnicDetails(
-            subnet_id=self.account['subnet_id'],
-            assign_public_ip=True,
-            display_name='my_instance_vnic',
-            hostname_label='my-instance'
-        )
-
         public_key_file = self.account_path + "/" + self.account['public_key']
         ssh_pub_key = open(public_key_file).read()
+        node = self.catalog[node_type]
+        availability_domain = self.get_availability_domain()
+
+        def launch_details(node_name):
+            vnic_details = oci.core.models.CreateVnicDetails(
+                subnet_id=self.account['subnet_id'],
+                assign_public_ip=True,
+                display_name=f"{node_name}-vnic",
+            )
+            return oci.core.models.LaunchInstanceDetails(
+                compartment_id=self.account['compartment_id'],
+                availability_domain=availability_domain,
+                shape=node.name,
+                shape_config=self.get_shape_config(node),
+                display_name=node_name,
+                create_vnic_details=vnic_details,
+                image_id=self.account['image_id'],
+                metadata={
+                    'ssh_authorized_keys': ssh_pub_key,
+                    'Name': node_name,
+                    'User': user_name,
+                    'node_type': node.name,
+                }
+            )
 
-       
-        list_availability_domains_response = oci.pagination.list_call_get_all_results(
-            self.identity_client.list_availability_domains,
-            self.account['compartment_id']
-        )
-        availability_domain = list_availability_domains_response.data[0]
-
-        instance_details = oci.core.models.LaunchInstanceDetails(
-            compartment_id=self.account['compartment_id'],
-            availability_domain=availability_domain.name,
-            shape=self.vendor['node-types'][node_type]['name'],
-            shape_config=oci.core.models.LaunchInstanceShapeConfigDetails(ocpus=1, memory_in_gbs=1),
-            display_name='my_instance',
-            create_vnic_details=vnic_details,
-            image_id=self.account['image_id'],
-            metadata={
-                'ssh_authorized_keys': ssh_pub_key,
-                'Name': node_name,
-                'User': user_name,
-                'node_type': self.vendor['node-types'][node_type]['name'],
-            }
-        )
+        # all the launches are submitted first, each returns as soon as its instance is PROVISIONING
+        instances = {}
+        for node_name in node_names:
+            try:
+                instances[node_name] = self.compute_client.launch_instance(launch_details(node_name)).data
+            except Exception as e:
+                print(Fore.RED + f"\nFailed to launch {node_name}. Reason: {e}" + Fore.RESET)
+        self.invalidate_inventory()
+
+        # then the instances are checked together, more and more rarely, until none of them is still starting
+        pending = {instance.id: node_name for node_name, instance in instances.items()}
+        delay = 2
+        deadline = time.time() + 600
+        while len(pending) > 0 and time.time() < deadline:
+            time.sleep(delay)
+            delay = min(2 * delay, 15)
+            if len(pending) == 1:
+                listed = [self.compute_client.get_instance(next(iter(pending))).data]
+            else:
+                listed = [instance for instance in self.get_instances() if instance.id in pending]
+            for instance in listed:
+                if instance.lifecycle_state not in ['PROVISIONING', 'STARTING']:
+                    instances[pending.pop(instance.id)] = instance
 
-        # Launch the instance
-        launch_instance_response = self.compute_client_composite_operations.launch_instance_and_wait_for_state(
-            instance_details,
-            wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_RUNNING]
-        )
-        instance = launch_instance_response.data
+        # the public IPs of all the running instances with one listing of the VNIC attachments
+        running = [instance for instance in instances.values()
+                   if instance.lifecycle_state == oci.core.models.Instance.LIFECYCLE_STATE_RUNNING]
+        public_ips = self.get_public_ips(running)
 
         nodes = {}
         # .pem file is the private key of the local machine that has a correponding public key listed
         # as in ~/.ssh/authorized_keys on the node
-        path = os.environ['SKYWAYROOT'] + '/etc/accounts/'
-        pem_file_full_path = path + self.account['private_key']
         username = self.vendor['username']
-        public_ip = self.get_host_ip(instance)
 
         if walltime is None:
             walltime_str = "00:05:00"
@@ -215,29 +205,52 @@ class OCI(Cloud):
         pt = datetime.strptime(walltime_str, "%H:%M:%S")
         walltime_in_minutes = int(pt.hour * 60 + pt.minute + pt.second/60)
 
-        # record node_type, launch time
-        instance_type = str(self.vendor['node-types'][node_type]['name'])
-        launch_time = instance.time_created.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-        nodes[node_names[0]] = [instance_type, launch_time, str(public_ip)]
-
         # perform post boot tasks on each node
         #   + mounting storage (/home, /software) from io-server 172.31.47.245 (private IP of the rcc-io node) (rcc-aws, not using a trusted agent)
         #   + executing some custom scripts
         #   + shut down the instance after the walltime
         #io_server = "172.31.47.245"
-        
-        #ip_converted = ip.replace('.','-')
 
-        print(f"\nCreated instance: {instance.display_name}")
+        def bootstrap(public_ip):
+            # need to install nfs-utils on the VM (or having an image that has nfs-utils installed)
+            cmd = f"ssh -i {self.my_ssh_private_key} -o StrictHostKeyChecking=accept-new {username}@{public_ip}"
+            cmd += f" -t 'sudo shutdown -P {walltime_in_minutes}'"
+            #cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mount -t nfs {io_server}:/software /software' "
+            return subprocess.run(cmd, shell=True, text=True, capture_output=True)
+
+        # the nodes are bootstrapped at the same time, the slowest one sets the time to ready
+        ready = {instance.id: public_ips[instance.id] for instance in running if public_ips.get(instance.id)}
+        results = {}
+        if len(ready) > 0:
+            with ThreadPoolExecutor(max_workers=min(16, len(ready))) as executor:
+                futures = {executor.submit(bootstrap, public_ip): ID for ID, public_ip in ready.items()}
+                for future in as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        results[futures[future]] = e
+
+        for node_name, instance in instances.items():
+            if instance.id not in results:
+                print(Fore.RED + f"\nInstance {node_name} {instance.id} failed to start (state: {instance.lifecycle_state})" + Fore.RESET)
+                continue
 
-        # need to install nfs-utils on the VM (or having an image that has nfs-utils installed)
-        print(f"To connect to the instance, run:")
-        cmd = f"  ssh -i {self.my_ssh_private_key} -o StrictHostKeyChecking=accept-new {username}@{public_ip} or"
-        print(f"  skyway_connect --account={self.account_name} {instance.display_name}")
-        print(f"{cmd}")
-        cmd += f" -t 'sudo shutdown -P {walltime_in_minutes}'; bash "
-        #cmd += f"-t 'sudo shutdown -P {walltime_in_minutes}; sudo mount -t nfs {io_server}:/software /software' "
-        p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
+            # record node_type, launch time
+            public_ip = ready[instance.id]
+            instance_type = str(instance.shape)
+            launch_time = instance.time_created.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+            nodes[node_name] = [instance_type, launch_time, str(public_ip)]
+            self.index_job(node_name, instance.id, public_ip, instance_type, instance.time_created, walltime_str)
+
+            print(f"\nCreated instance: {node_name}")
+            result = results[instance.id]
+            if isinstance(result, Exception) or result.returncode != 0:
+                reason = result if isinstance(result, Exception) else (result.stderr.strip().splitlines() or ['ssh failed'])[-1]
+                print(Fore.RED + f"Post-boot setup failed on {node_name}: {reason}" + Fore.RESET)
+
+            print(f"To connect to the instance, run:")
+            print(f"  ssh -i {self.my_ssh_private_key} -o StrictHostKeyChecking=accept-new {username}@{public_ip} or")
+            print(f"  skyway_connect --account={self.account_name} -J {node_name}")
 
         return nodes
 
@@ -317,23 +330,17 @@ class OCI(Cloud):
         if node_names is None and IDs is None:
             raise ValueError(f"node_names and IDs cannot be both empty.")
 
-        # List all instances in the compartment
-        instance_list = oci.pagination.list_call_get_all_results(
-            self.compute_client.list_instances,
-            self.account['compartment_id']
-        ).data
-
-        # Filter the instances to get only the running ones
-        running_instances = [instance for instance in instance_list if instance.lifecycle_state == 'RUNNING']
-
-        # Terminate instances with the given names
+        # Terminate the running instances with the given names
+        found = self.lookup_many(names=node_names, states=['RUNNING'])
         for node in node_names:
-            for instance in running_instances:
-                if instance.display_name == node:
-                    self.compute_client_composite_operations.terminate_instance_and_wait_for_state(
-                        instance.id,
-                        wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_TERMINATED]
-                    )
+            item = found.get(node)
+            if item is not None:
+                self.compute_client_composite_operations.terminate_instance_and_wait_for_state(
+                    item.id,
+                    wait_for_states=[oci.core.models.Instance.LIFECYCLE_STATE_TERMINATED]
+                )
+                self.job_index.remove(ids=[item.id])
+        self.invalidate_inventory()
 
 
     def check_valid_user(self, user_name, verbose=False):
@@ -357,6 +364,7 @@ class OCI(Cloud):
         compute the accumulating cost from the pkl database
         and the remaining balance
         '''
+        import pandas as pd
         if user_name not in self.users:
             raise Exception(f"{user_name} is not listed in the user group of this account.")
                 
@@ -416,23 +424,7 @@ class OCI(Cloud):
         """
         List all the node (instance) types provided by the vendor and their unit prices
         """
-        node_info = []
-        for node_type in self.vendor['node-types']:
-            if 'gpu' in self.vendor['node-types'][node_type]:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              self.vendor['node-types'][node_type]['gpu'],
-                              self.vendor['node-types'][node_type]['gpu-type'],
-                              self.vendor['node-types'][node_type]['price']])
-            else:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              "0",
-                              "--",
-                              self.vendor['node-types'][node_type]['price']])
-        print(tabulate(node_info, headers=['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost ($)']))
+        print(tabulate(self.catalog.rows(), headers=NodeTypeCatalog.headers))
         print("")
 
     def get_group_members(self):
@@ -450,18 +442,15 @@ class OCI(Cloud):
         Return identifiers of all running instances
         """
 
-        instances = self.get_instances(filters = [{
-            "Name" : "instance-state-name",
-            "Values" : ["running"]
-        }])
+        instances = self.get_inventory().instances(states=['RUNNING'])
         
         nodes = []
         
         for instance in instances:
             nodes.append([self.get_instance_name(instance),
-                              instance.state['Name'], 
-                              instance.instance_type, 
-                              instance.instance_id])
+                              instance.lifecycle_state, 
+                              instance.shape, 
+                              instance.id])
         
         if verbose == True:
             print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host IP']))
@@ -472,41 +461,67 @@ class OCI(Cloud):
 
     def get_host_ip(self, instance):
         """Member function: get the IP address of an instance (node) 
-         - ID: instance identifier
+         - instance: an instance object, or its identifier
         """
-        public_ip = ""
-        vn_client = oci.core.VirtualNetworkClient(self.config)
-
-        vnic_attachments = self.compute_client.list_vnic_attachments(
-            compartment_id=instance.compartment_id,
-            instance_id=instance.id
-        ).data
-
-        if vnic_attachments:
-            vnic_id = vnic_attachments[0].vnic_id
-
-            # Get the VNIC details
-            vnic = vn_client.get_vnic(vnic_id).data
-            
-            # Retrieve the public IP address
-            public_ip = vnic.public_ip
-            print(f"Public IP Address: {public_ip}")
-        else:
-            print("No VNIC attachments found for this instance.")
-        
-        return public_ip
-
-
-    def get_all_images(self, owners=['self']):
-        try:
+        if isinstance(instance, str):
+            item = self.lookup_job(instance_id=instance)
+            if item is None:
+                raise ValueError(f"Instance '{instance}' not found.")
+            return item.ip
+
+        return self.get_public_ips([instance]).get(instance.id, "")
+
+    def get_public_ips(self, instances, vnic_attachments=None):
+        """Member function: get the public IP addresses of instances
+        The VNIC attachments of the compartment are listed with one (paginated) call unless given,
+        then the VNICs of the instances are fetched concurrently.
+        Return: a dict instance ID -> public IP, without the instances that have no VNIC attached
+        """
+        instance_ids = set(instance.id for instance in instances)
+        if len(instance_ids) == 0:
+            return {}
+
+        if vnic_attachments is None:
+            # a single instance is asked for directly
+            filters = {'instance_id': next(iter(instance_ids))} if len(instance_ids) == 1 else {}
+            vnic_attachments = oci.pagination.list_call_get_all_results(
+                self.compute_client.list_vnic_attachments, self.account['compartment_id'], **filters
+            ).data
+
+        # the first VNIC attached to each instance
+        vnic_ids = {}
+        for attachment in vnic_attachments:
+            if attachment.instance_id in instance_ids and attachment.lifecycle_state == 'ATTACHED':
+                vnic_ids.setdefault(attachment.instance_id, attachment.vnic_id)
+        if len(vnic_ids) == 0:
+            return {}
+
+        def get_public_ip(vnic_id):
+            return self.network_client.get_vnic(vnic_id).data.public_ip
+
+        with ThreadPoolExecutor(max_workers=min(16, len(vnic_ids))) as executor:
+            public_ips = executor.map(get_public_ip, vnic_ids.values())
+            return dict(zip(vnic_ids.keys(), public_ips))
+
+
+    def get_all_images(self, owners=['self'], refresh=False):
+        '''
+        print and return the images (ID, name, description) of the compartment
+        '''
+        def fetch():
             list_images_response = oci.pagination.list_call_get_all_results(
-                self.compute.list_images,
-                self.compartment_id,
+                self.compute_client.list_images,
+                self.account['compartment_id'],
             )
-            images = list_images_response.data
+            return [(image.id, image.display_name, image.operating_system + ' ' + image.operating_system_version)
+                    for image in list_images_response.data]
 
-            for image in images:
-                print(f"Image ID: {image.id}, Name: {image.name}, Description: {image.description}")
+        try:
+            images = self.metadata.get('images', fetch, refresh=refresh)
+
+            for image_id, name, description in images:
+                print(f"Image ID: {image_id}, Name: {name}, Description: {description}")
+            return images
 
         except Exception as e:
             print(f"An error occurred: {e}")
@@ -528,16 +543,8 @@ class OCI(Cloud):
         Note: AWS doesn't use unique name for instances, instead, name is an
         attribute stored in the tags.        
         """
-        running_instances = self.get_instances()
-                
-        for instance in running_instances:
-            if instance.tags is None: continue
-
-            for tag in instance.tags:
-                if tag['Key'] == 'Name':
-                    if tag['Value'] == instance_name:
-                        return instance.id
-        return ''
+        item = self.lookup_job(name=instance_name)
+        return item.id if item is not None else ''
 
     def get_instance_user_name(self, instance):
         """Member function: get_instance_user_name
@@ -546,48 +553,95 @@ class OCI(Cloud):
          - instance:
         """
         
-        if instance.tags is None: return ''
+        # the user name is stored in the metadata when the instance is launched
+        if instance.metadata is None: return ''
 
-        for tag in instance.tags:
-            if tag['Key'] == 'User':
-                return tag['Value']
-        
-        return ''
+        return instance.metadata.get('User', '')
 
 
-    def get_instances(self, filters = []):
+    def get_instances(self, filters = {}):
         """Member function: get_instances
-        Get a list of instance objects with give filters
-        NOTE: if using libcloud then use self.driver.list_nodes()
+        Get a list of instance objects with give filters,
+        the keyword arguments of ComputeClient.list_instances(), e.g. {'lifecycle_state': 'RUNNING', 'display_name': 'my-run'}
+        """
+        return oci.pagination.list_call_get_all_results(
+            self.compute_client.list_instances, self.account['compartment_id'], **filters
+        ).data
+
+    def inventory_items(self, instances, vnic_attachments=None):
+        public_ips = self.get_public_ips(instances, vnic_attachments)
+        return [InventoryItem(instance.display_name,
+                              instance.id,
+                              public_ips.get(instance.id, ""),
+                              self.get_instance_user_name(instance),
+                              instance.lifecycle_state,
+                              instance) for instance in instances]
+
+    def iter_inventory(self):
+        """
+        List the instances of the compartment (in every lifecycle state, node_record drops the terminated ones)
+        and their public IPs with one (paginated) call each, the IPs are joined to the instances one page at a time
         """
-        instance_list = oci.pagination.list_call_get_all_results(
-            self.compute_client.list_instances, self.account['compartment_id']
+        vnic_attachments = oci.pagination.list_call_get_all_results(
+            self.compute_client.list_vnic_attachments, self.account['compartment_id']
         ).data
+        pages = oci.pagination.list_call_get_all_results_generator(
+            self.compute_client.list_instances, 'response', self.account['compartment_id']
+        )
+        for response in pages:
+            yield from self.inventory_items(response.data, vnic_attachments)
 
-        # Filter the instances to get only the running ones
-        instances = [instance for instance in instance_list if instance.lifecycle_state == 'RUNNING']
-        return instances
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        """
+        List the instances with the given names or IDs, owner and states;
+        OCI filters on one display name and one lifecycle state, the other conditions are checked here
+        """
+        if ids is not None and len(ids) == 1:
+            try:
+                instances = [self.compute_client.get_instance(ids[0]).data]
+            except oci.exceptions.ServiceError as e:
+                if e.status != 404:
+                    raise
+                instances = []
+        else:
+            filters = {}
+            if names is not None and len(names) == 1:
+                filters['display_name'] = names[0]
+            if states is not None and len(states) == 1:
+                filters['lifecycle_state'] = states[0]
+            instances = self.get_instances(filters)
+
+        instances = [instance for instance in instances
+                     if (names is None or instance.display_name in names) and (ids is None or instance.id in ids)
+                     and (states is None or instance.lifecycle_state in states)
+                     and (owner is None or self.get_instance_user_name(instance) == owner)]
+        return self.inventory_items(instances)
+
+    def get_shape_config(self, node_type):
+        """Member function: get_shape_config
+        The OCPUs and memory of a flexible shape (e.g. VM.Standard.E4.Flex) from the cores and memgb
+        of its node type in cloud.yaml, None for a fixed shape, which takes no shape configuration
+        """
+        if not node_type.name.endswith('.Flex'):
+            return None
+        return oci.core.models.LaunchInstanceShapeConfigDetails(
+            ocpus=float(node_type.cores or 1),
+            memory_in_gbs=float(node_type.memgb) if node_type.memgb is not None else None)
 
     def get_unit_price_instance(self, instance):
         """
         Get the per-hour price of an instance depending on its instance_type (e.g. t2.micro)
         """
-        for node_type in self.vendor['node-types']:
-            if self.vendor['node-types'][node_type]['name'] == instance.shape:
-                unit_price = self.vendor['node-types'][node_type]['price']
-                return unit_price
-        return -1.0
+        return self.catalog.instance_price(instance.shape)
 
     def get_unit_price(self, node_type: str):
         """
         Get the per-hour price of an instance depending on its node type (e.g. t1)
         """
-        if node_type in self.vendor['node-types']:
-            return self.vendor['node-types'][node_type]['price']
-        return -1.0
+        return self.catalog.price(node_type)
 
     def get_running_cost(self, verbose=True):
-        instances = self.get_instances()
+        instances = self.get_inventory().instances()
 
         nodes = []
         total_cost = 0.0
@@ -596,15 +650,15 @@ class OCI(Cloud):
             if self.get_instance_name(instance) in self.account['protected_nodes']:
                 continue
 
-            if instance.state['Name'] == 'running':
-                running_time = datetime.now(timezone.utc) - instance.launch_time
+            if instance.lifecycle_state == 'RUNNING':
+                running_time = datetime.now(timezone.utc) - instance.time_created
                 instance_unit_cost = self.get_unit_price_instance(instance)
                 running_cost = running_time.seconds/3600.0 * instance_unit_cost
                 total_cost = total_cost + running_cost
                 nodes.append([self.get_instance_name(instance),
-                                    instance.state['Name'], 
+                                    instance.lifecycle_state, 
                                     instance.shape, 
-                                    instance.instance_id,
+                                    instance.id,
                                     running_time,
                                     running_cost])
         if verbose == True:
@@ -613,10 +667,11 @@ class OCI(Cloud):
         return total_cost
     
 
-    def get_availability_domain(identity, compartment_id):
-        list_availability_domains_response = oci.pagination.list_call_get_all_results(
-                    identity.list_availability_domains, compartment_id)
+    def get_availability_domain(self):
+        def fetch():
+            list_availability_domains_response = oci.pagination.list_call_get_all_results(
+                        self.identity_client.list_availability_domains, self.account['compartment_id'])
+            return [domain.name for domain in list_availability_domains_response.data]
         # just return the first availability domain
         # but for Production code you should have a better way of determining what is needed
-        availability_domain = list_availability_domains_response.data[0]
-        return availability_domain.name
\ No newline at end of file
+        return self.metadata.get('availability-domains', fetch)[0]
\ No newline at end of file
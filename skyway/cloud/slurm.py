@@ -7,18 +7,18 @@
 Documentation for SLURMCluster Class
 """
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import io
 import logging
 import os
+import shlex
 import subprocess
 from tabulate import tabulate
 
-from .core import Cloud
+from .core import Cloud, InventoryItem, NodeRecord, NodeTypeCatalog
 from .. import utils
 
 from colorama import Fore
-import pandas as pd
 
 class SLURMJob:
     def __init__(self, jobid, state, job_name, instance_type, host, running_time="", start_time=""):
@@ -34,6 +34,8 @@ class SLURMCluster(Cloud):
     """Documentation for SLURMCluster
     This Class is used as the driver to operate SLURM-provisioned resource for [Demo]
     """
+
+    running_states = ['R']
     
     def __init__(self, account):
         """Constructor:
@@ -63,6 +65,7 @@ class SLURMCluster(Cloud):
             raise Exception(f'Service provider slurm is undefined.')
 
         self.vendor = vendor_cfg['slurm']
+        self.catalog = NodeTypeCatalog(self.vendor['node-types'])
         self.account_name = account
         self.onpremises = True
        
@@ -89,23 +92,7 @@ class SLURMCluster(Cloud):
         """
         List all the node (instance) types provided by the vendor and their unit prices
         """
-        node_info = []
-        for node_type in self.vendor['node-types']:
-            if 'gpu' in self.vendor['node-types'][node_type]:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              self.vendor['node-types'][node_type]['gpu'],
-                              self.vendor['node-types'][node_type]['gpu-type'],
-                              self.vendor['node-types'][node_type]['price']])
-            else:
-                node_info.append([node_type, self.vendor['node-types'][node_type]['name'],
-                              self.vendor['node-types'][node_type]['cores'],
-                              self.vendor['node-types'][node_type]['memgb'],
-                              "0",
-                              "--",
-                              self.vendor['node-types'][node_type]['price']])
-        print(tabulate(node_info, headers=['Name', 'Instance Type', 'CPU Cores', 'Memory (GB)', 'GPU', 'GPU Type', 'Per-hour Cost (SU)']))
+        print(tabulate(self.catalog.rows(), headers=NodeTypeCatalog.headers[:-1] + ['Per-hour Cost (SU)']))
         print("")
 
     def get_group_members(self):
@@ -159,6 +146,7 @@ class SLURMCluster(Cloud):
         compute the accumulating cost from the SLURM database
         and the remaining balance
         '''
+        import pandas as pd
         user_name = os.environ['USER']
         user_budget = self.users[user_name]['budget']
 
@@ -188,68 +176,25 @@ class SLURMCluster(Cloud):
 
     # instance operations
 
-    def list_nodes(self, show_protected_nodes=False, verbose=False):
+    def node_record(self, item):
         '''
-        list all the running/queueing nodes (aka instances) using squeue
+        the NodeRecord of a running/queueing job (aka instance) listed by squeue,
+        its launch time is inferred from the elapsed time ([days-]hours:minutes:seconds)
         '''
-        user_name = os.environ['USER']
-        # job_id state job_name account nodelist   runningtime starttime comment user_name"
-        cmd = f"export SQUEUE_FORMAT=\"%13i %.4t %24j %16a %N %M %V %k %u\"; squeue -u {user_name} -h"
-
-        proc = subprocess.Popen([cmd], stdout=subprocess.PIPE, shell=True)
-        (out, err) = proc.communicate()
-      
-        # encode output as utf-8 from bytes, remove newline character
-        m = out.decode('utf-8').strip()
-
-        i = 0
-        nodes = []
-        for line in m.splitlines():
-
-            node_info = line.split()
-
-            jobid = node_info[0]
-            state = node_info[1]
-            job_name = node_info[2]
-            instance_type = node_info[7] # node_info getting from comment 
-            instance_id = node_info[4]   # nodelist, can be used as public_host_ip
-            running_time = node_info[5]  
-            #start_time = node_info[6]
-
-            unit_price = 1.0 #self.vendor['node-types'][node_type]['price']
-            time_stamp = running_time.split(':')
-            running_time_hours = 0
-            # we don't expect any instance run longer than a day
-            if len(time_stamp) == 3:
-                pt = datetime.strptime(running_time, "%H:%M:%S")
-                running_time_hours = float(pt.second)/3600.0 + float(pt.minute)/60.0 + pt.hour
-            elif len(time_stamp) == 2:
-                pt = datetime.strptime(running_time, "%M:%S")
-                running_time_hours = float(pt.second)/3600.0 + float(pt.minute)/60.0 + pt.hour
-            else:
-                print(f"Running time: {running_time} {time_stamp}")
-
-            running_cost = running_time_hours * unit_price
-
-            nodes.append([job_name,
-                          state,
-                          instance_type,
-                          jobid,
-                          instance_id,
-                          running_time,
-                          running_cost])
-            i = i + 1
-        
-        output_str = ''
-        if verbose == True:
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']))
-            print("")
-        else:
-            output_str = io.StringIO()
-            print(tabulate(nodes, headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']), file=output_str)
-            print("", file=output_str)
-        return nodes, output_str
-
+        job = item.instance
+        launch_time = None
+        try:
+            days, _, clock = job.running_time.rpartition('-')
+            seconds = 0
+            for field in clock.split(':'):
+                seconds = seconds * 60 + int(field)
+            seconds += int(days or 0) * 86400
+            launch_time = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+        except ValueError:
+            print(f"Running time: {job.running_time}")
+
+        unit_price = 1.0 #self.vendor['node-types'][node_type]['price']
+        return NodeRecord(item.name, item.owner, item.state, job.instance_type, item.id, item.ip, launch_time, unit_price)
 
     def create_nodes(self, node_type: str, node_names = [], interactive = False, need_confirmation = True, walltime = None):
         '''
@@ -262,7 +207,7 @@ class SLURMCluster(Cloud):
         running_cost = self.get_running_cost(verbose=False)
         usage = usage + running_cost
         remaining_balance = user_budget - usage
-        unit_price = self.vendor['node-types'][node_type]['price']
+        unit_price = self.catalog[node_type].price
         if need_confirmation == True:
             print(f"User budget: {user_budget:.3f} SU")
             print(f"+ Usage    : {usage:.3f} SU")
@@ -276,8 +221,8 @@ class SLURMCluster(Cloud):
         else:
             walltime_str = walltime
         
-        ntasks_per_node = self.vendor['node-types'][node_type]['cores']
-        memgb = int(self.vendor['node-types'][node_type]['memgb'])
+        ntasks_per_node = self.catalog[node_type].cores
+        memgb = int(self.catalog[node_type].memgb)
 
         count = len(node_names)
         if count <= 0:
@@ -302,6 +247,7 @@ class SLURMCluster(Cloud):
         print(f"{cmd}")
         #p = subprocess.run(cmd, shell=True, text=True, capture_output=True)
         os.system(cmd)
+        self.invalidate_inventory()
 
     def connect_node(self, node_name, separate_terminal=True):
         '''
@@ -326,6 +272,7 @@ class SLURMCluster(Cloud):
         '''
         destroy several nodes (aka instances) given a list of node names using scancel
         '''
+        import pandas as pd
         user_name = os.environ['USER']
 
         # maybe no need to check if the job ID belongs the current user because scancel will throw errors otherwise
@@ -357,7 +304,7 @@ class SLURMCluster(Cloud):
             running_time = node_info[5]  
             start_time = node_info[6]
             
-            unit_price = self.vendor['node-types'][instance_type]['price']
+            unit_price = self.catalog[instance_type].price
             time_stamp = running_time.split(':')
             running_time_hours = 0
             # we don't expect any instance run longer than a day
@@ -387,6 +334,8 @@ class SLURMCluster(Cloud):
             cmd = f"scancel {instanceID}"
             os.system(cmd)
 
+        self.invalidate_inventory()
+
     def get_running_nodes(self, verbose=False):
         '''
         list all the running nodes (aka instances)
@@ -454,26 +403,15 @@ class SLURMCluster(Cloud):
 
     def get_running_cost(self, verbose=True):
         total_cost = 0.0
-        user_name = os.environ['USER']
-
-        # job_id state job_name account nodelist   runningtime starttime comment user_name"
-        cmd = f"export SQUEUE_FORMAT=\"%13i %.4t %24j %16a %N %M %V %k %u\"; squeue -u {user_name} -h"
-
-        proc = subprocess.Popen([cmd], stdout=subprocess.PIPE, shell=True)
-        (out, err) = proc.communicate()
-      
-        # encode output as utf-8 from bytes, remove newline character
-        m = out.decode('utf-8').strip()
 
         i = 0
         nodes = []
-        for line in m.splitlines():
+        for job in self.get_inventory().instances():
 
-            node_info = line.split()
-            state = node_info[1]
+            state = job.state
             if state.lower() != "r":
                 continue
-            running_time = node_info[5]
+            running_time = job.running_time
 
             unit_price = 1.0 #self.vendor['node-types'][node_type]['price']
             time_stamp = running_time.split(':')
@@ -521,13 +459,8 @@ class SLURMCluster(Cloud):
         '''
         return the job ID of a job name (instance name) used for scancel in destroy_nodes()
         '''
-        nodes, _ = self.get_running_nodes(verbose=False)
-        instance_ID = None
-        for node in nodes:
-            # node = [job_name, state, instance_type, jobid, instance_id, running_time, running_cost]
-            if node[0] == instance_name:
-                instance_ID = node[3]
-        return instance_ID
+        item = self.lookup(name=instance_name, states=['R'])
+        return item.id if item is not None else None
 
 
     def get_host_ip(self, instance_name):
@@ -535,52 +468,69 @@ class SLURMCluster(Cloud):
         get the public IP or host (node list for SLURM) of a instance (job) name
         
         '''
-        nodes, _ = self.get_running_nodes(verbose=False)
-        instance_ID = None
-        for node in nodes:
-            # node = [job_name, state, instance_type, jobid, instance_id, running_time, running_cost]
-            if node[0] == instance_name:
-                instance_ID = node[4]
-        return instance_ID
+        item = self.lookup(name=instance_name, states=['R'])
+        return item.ip if item is not None else None
 
     def get_unit_price(self, node_type: str):
         '''
         get the unit price of a node object (inferring from its name and from the cloud.yaml file)
         '''
-        if node_type in self.vendor['node-types']:
-            return self.vendor['node-types'][node_type]['price']
-        return -1.0
+        return self.catalog.price(node_type)
 
     def get_instances(self, filters = []):
         """Member function: get_instances
-        Get a list of instance objects with give filters
+        Get a list of instance objects with give filters, squeue options such as ['-n run1,run2', '-t R']
+        """
+        return list(self.iter_instances(filters))
+
+    def iter_instances(self, filters = []):
+        """Member function: iter_instances
+        Yield the jobs of the user as squeue prints them (see get_instances())
         """
         user_name = os.environ['USER']
 
         # job_id state job_name account nodelist   runningtime starttime comment user_name"
-        cmd = f"export SQUEUE_FORMAT=\"%13i %.4t %24j %16a %N %M %V %k %u\"; squeue -u {user_name} -h"
-
-        proc = subprocess.Popen([cmd], stdout=subprocess.PIPE, shell=True)
-        (out, err) = proc.communicate()
-      
-        # encode output as utf-8 from bytes, remove newline character
-        m = out.decode('utf-8').strip()
-
-        i = 0
-        nodes = []
-        for line in m.splitlines():
-  
-            node_info = line.split()
-            
-            jobid = node_info[0]
-            state = node_info[1]
-            job_name = node_info[2]
-            instance_type = node_info[7] # node_info getting from comment 
-            instance_id = node_info[4]   # nodelist, can be used as public_host_ip
-            running_time = node_info[5]
-            start_time = node_info[6]
+        cmd = f"export SQUEUE_FORMAT=\"%13i %.4t %24j %16a %N %M %V %k %u\"; squeue -u {user_name} -h {' '.join(filters)}"
+
+        with subprocess.Popen([cmd], stdout=subprocess.PIPE, shell=True) as proc:
+            for line in proc.stdout:
+                # encode output as utf-8 from bytes
+                node_info = line.decode('utf-8').split()
+                if len(node_info) < 8:
+                    continue
+
+                jobid = node_info[0]
+                state = node_info[1]
+                job_name = node_info[2]
+                instance_type = node_info[7] # node_info getting from comment 
+                instance_id = node_info[4]   # nodelist, can be used as public_host_ip
+                running_time = node_info[5]
+                start_time = node_info[6]
+
+                yield SLURMJob(jobid, state, job_name, instance_type, instance_id, running_time, start_time)
+
+    def iter_inventory(self):
+        '''
+        list the jobs of the user with one squeue call, the host of a job is its node list
+        '''
+        user_name = os.environ['USER']
+        for job in self.iter_instances():
+            yield InventoryItem(job.job_name, job.jobid, job.host, user_name, job.state, job)
 
-            instance = SLURMJob(jobid, state, job_name, instance_type, instance_id, running_time, start_time)
-            nodes.append(instance)
-            
-        return nodes
\ No newline at end of file
+    def find_instances(self, names=None, ids=None, owner=None, states=None):
+        '''
+        list the jobs of the user with the given names or job IDs and states with one filtered squeue call
+        '''
+        user_name = os.environ['USER']
+        if owner is not None and owner != user_name:
+            return []
+        filters = []
+        if names is not None:
+            filters.append("-n " + shlex.quote(','.join(names)))
+        if ids is not None:
+            filters.append("-j " + ','.join(str(jobid) for jobid in ids))
+        if states is not None:
+            filters.append("-t " + ','.join(states))
+        return [InventoryItem(job.job_name, job.jobid, job.host, user_name, job.state, job)
+                for job in self.get_instances(filters)
+                if (names is None or job.job_name in names) and (states is None or job.state in states)]
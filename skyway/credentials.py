@@ -0,0 +1,138 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Short-lived credentials (AWS STS sessions, Azure AD and Google OAuth access tokens) of an account,
+shared by all the commands of a user through a 0600 file under $SKYWAYROOT/run/<user>
+so that only the first command after expiry talks to the identity service.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+
+from . import utils
+
+class CredentialCache():
+    '''
+    credentials of an account by kind (e.g. "sts", "azure:<scope>"), each stored with its expiry (epoch seconds)
+    '''
+    def __init__(self, account_name: str, margin=900):
+        self.account_name = account_name
+        try:
+            self.path = utils.run_path(f'credentials-{account_name}.json')
+        except OSError:
+            # no writable runtime folder, every command gets its own credentials
+            self.path = None
+        # a credential is not handed out in its last [margin] seconds,
+        # and is refreshed in the background during the [margin] seconds before that
+        self.margin = margin
+
+    def file(self, kind: str):
+        '''
+        path of a separate credential file, for SDKs that manage their own token file (e.g. libcloud GCE),
+        None (the default of the SDK) without a writable runtime folder
+        '''
+        if self.path is None:
+            return None
+        try:
+            return utils.run_path(f'credentials-{self.account_name}-{kind}.json')
+        except OSError:
+            return None
+
+    def _read(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, kind: str, value, expires: float):
+        if self.path is None:
+            return
+        entries = self._read()
+        now = time.time()
+        # drop the expired entries while rewriting the file
+        entries = {k: v for k, v in entries.items() if v['expires'] > now}
+        entries[kind] = {'value': value, 'expires': expires}
+        try:
+            utils.write_private(self.path, json.dumps(entries).encode())
+        except OSError:
+            # the credential is used by this command only
+            pass
+
+    def get(self, kind: str, fetch):
+        '''
+        return the credential of the given kind, fetch() returns a new (value, expires) pair
+        when the cached one is missing or about to expire
+        '''
+        if self.path is None:
+            return fetch()[0]
+        entry = self._read().get(kind)
+        now = time.time()
+        if entry is not None and entry['expires'] - now > self.margin:
+            if entry['expires'] - now < 2 * self.margin:
+                # still valid: hand it out and let one process renew it meanwhile,
+                # in a daemon thread so that a short command does not wait for the identity service to exit
+                threading.Thread(target=self._refresh, args=(kind, fetch, False), daemon=True).start()
+            return entry['value']
+        return self._refresh(kind, fetch, True)
+
+    def _refresh(self, kind, fetch, wait):
+        '''
+        fetch a new credential while holding a lock, so that concurrent commands do not all call the identity service
+        '''
+        try:
+            fd = os.open(self.path + '.lock', os.O_WRONLY | os.O_CREAT, 0o600)
+        except OSError:
+            # the runtime folder is not writable: fetch without sharing the credential
+            return fetch()[0] if wait else None
+        with os.fdopen(fd, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # another process is refreshing it already
+                return None
+
+            # the credential may have been renewed while waiting for the lock
+            entry = self._read().get(kind)
+            if entry is not None and entry['expires'] - time.time() > 2 * self.margin:
+                return entry['value']
+
+            value, expires = fetch()
+            self.put(kind, value, expires)
+            return value
+
+class CachedTokenCredential():
+    '''
+    azure.core TokenCredential handing out the tokens of another credential (e.g. ClientSecretCredential)
+    through the credential cache of the account
+    '''
+    def __init__(self, credential, cache: CredentialCache):
+        self.credential = credential
+        self.cache = cache
+
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+
+        def fetch():
+            token = self.credential.get_token(*scopes, **kwargs)
+            return {'token': token.token, 'expires_on': token.expires_on}, token.expires_on
+
+        token = self.cache.get('azure:' + ' '.join(scopes), fetch)
+        return AccessToken(token['token'], token['expires_on'])
+
+    def close(self):
+        self.credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,308 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+skywayd: a per-user daemon that keeps the provider objects (boto3 resources, libcloud drivers,
+Azure credentials, OCI clients) and their connection pools alive between commands.
+
+The skyway_* commands talk to it through a Unix socket under $SKYWAYROOT/run/<user>,
+and construct the provider in their own process when the daemon is not running.
+Messages are pickled and prefixed by their length; the socket is only reachable by its owner.
+What a call prints is sent to the command as it is written, before the reply, and an exception
+raised by a call is raised again in the command with its own type.
+"""
+
+import contextlib
+import io
+import os
+import pickle
+import socket
+import struct
+import sys
+import threading
+import time
+
+from . import debug
+from . import utils
+
+# provider methods served by the daemon: they neither read from the terminal nor open a terminal
+REMOTE_METHODS = {
+    'check_valid_user', 'get_budget', 'get_cost_and_usage_from_db', 'get_group_members',
+    'get_host_ip', 'get_instance_ID', 'get_node_connection_info', 'get_node_types',
+    'get_running_cost', 'get_running_nodes', 'get_unit_price', 'list_nodes',
+    'get_all_images', 'refresh_metadata', 'invalidate_inventory', 'node_table',
+}
+
+# provider methods served by the daemon only when they do not ask for confirmation
+CONFIRMED_METHODS = {'create_nodes', 'destroy_nodes'}
+
+# marker returned for an attribute that cannot be served remotely (e.g. connect_node)
+LOCAL = 'skywayd:local'
+
+def socket_path():
+    return utils.run_path('skywayd.sock')
+
+def send_message(sock, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack('!I', len(data)) + data)
+
+def recv_message(sock):
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    size, = struct.unpack('!I', header)
+    return pickle.loads(_recv_exactly(sock, size))
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def request(message, timeout=None):
+    '''
+    send a request to the daemon and return its reply, raise OSError if the daemon is not running;
+    the output of the call is written to stdout as it arrives
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path())
+        send_message(sock, message)
+        reply = recv_message(sock)
+        while reply is not None and 'output' in reply:
+            sys.stdout.write(reply['output'])
+            sys.stdout.flush()
+            reply = recv_message(sock)
+    finally:
+        sock.close()
+    if reply is None:
+        raise OSError('skywayd closed the connection.')
+    return reply
+
+class ProviderProxy():
+    '''
+    stand-in for a provider object whose methods are executed by skywayd,
+    anything the daemon cannot serve is executed by a provider constructed in this process
+    '''
+    def __init__(self, account_name: str, vendor_name: str):
+        self._account_name = account_name
+        self._vendor_name = vendor_name
+        self._local = None
+
+    def _local_provider(self):
+        if self._local is None:
+            from . import cloud
+            self._local = cloud.create(self._account_name, self._vendor_name)
+        return self._local
+
+    def _call(self, method, args, kwargs):
+        reply = request({'op': 'call', 'account': self._account_name, 'vendor': self._vendor_name,
+                         'method': method, 'args': args, 'kwargs': kwargs})
+        if reply['stdout']:
+            sys.stdout.write(reply['stdout'])
+        if 'error' in reply:
+            error = reply['error']
+            # the exception of the call itself (e.g. ValueError for a node not found), as without the daemon
+            raise error if isinstance(error, BaseException) else Exception(error)
+        return reply['result']
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        if name in REMOTE_METHODS or name in CONFIRMED_METHODS:
+            def method(*args, **kwargs):
+                if name in CONFIRMED_METHODS and kwargs.get('need_confirmation', True):
+                    # input() has to run in the terminal of the user
+                    result = getattr(self._local_provider(), name)(*args, **kwargs)
+                    # the nodes changed behind the back of the daemon
+                    self._call('invalidate_inventory', (), {})
+                    return result
+                return self._call(name, args, kwargs)
+            return method
+
+        # plain data such as users, vendor or catalog comes from the daemon, methods run here
+        if self._local is None:
+            reply = request({'op': 'attr', 'account': self._account_name, 'vendor': self._vendor_name, 'name': name})
+            if 'error' in reply:
+                raise AttributeError(str(reply['error']))
+            if reply['result'] != LOCAL:
+                return reply['result']
+        return getattr(self._local_provider(), name)
+
+def picklable(value):
+    try:
+        pickle.dumps(value)
+        return True
+    except Exception:
+        return False
+
+def remote_error(e):
+    '''
+    the exception of a call as sent to the command: the exception itself if it can be rebuilt from a pickle
+    (e.g. ValueError), otherwise its type name and message
+    '''
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return f'{type(e).__name__}: {e}'
+
+class OutputStream(io.TextIOBase):
+    '''
+    stdout of a call, sent to the command as it is written so that progress messages show up while the call runs
+    '''
+    def __init__(self, sock):
+        self.sock = sock
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text and self.sock is not None:
+            try:
+                send_message(self.sock, {'output': text})
+            except OSError:
+                # the command has gone, the call goes on without output
+                self.sock = None
+        return len(text)
+
+def connect(account_name: str, vendor_name: str):
+    '''
+    return a proxy to the provider held by skywayd if the daemon is running, otherwise None
+    '''
+    try:
+        reply = request({'op': 'ping'}, timeout=2.0)
+    except (OSError, socket.timeout):
+        return None
+    if reply.get('result') != 'pong':
+        return None
+    return ProviderProxy(account_name, vendor_name)
+
+class Daemon():
+    '''
+    hold one provider object per account, rebuilt when the account or cloud.yaml file changes
+    '''
+    def __init__(self, idle_timeout=3600):
+        self.idle_timeout = idle_timeout
+        self.last_request = time.time()
+        self.started = time.time()
+        self.providers = {}
+        # provider objects are not thread-safe and stdout is captured per call, so calls are serialized
+        self.lock = threading.Lock()
+
+    def config_key(self, account_name):
+        files = [os.environ['SKYWAYROOT'] + f'/etc/accounts/{account_name}.yaml',
+                 os.environ['SKYWAYROOT'] + '/etc/cloud.yaml']
+        return tuple((os.stat(f).st_size, os.stat(f).st_mtime_ns) for f in files)
+
+    def provider(self, account_name, vendor_name):
+        from . import cloud
+        vendor = cloud.vendor_of(vendor_name)
+        key = self.config_key(account_name)
+        entry = self.providers.get((account_name, vendor))
+        if entry is None or entry[0] != key:
+            entry = (key, cloud.create(account_name, vendor))
+            self.providers[(account_name, vendor)] = entry
+        return entry[1]
+
+    def handle(self, message, output=None):
+        '''
+        serve a request, what the call prints goes to output (an OutputStream) or is returned with the reply
+        '''
+        op = message.get('op')
+        if op == 'ping':
+            return {'result': 'pong', 'stdout': ''}
+        if op == 'status':
+            return {'result': {'pid': os.getpid(), 'uptime': time.time() - self.started,
+                               'accounts': sorted(account for account, _ in self.providers)}, 'stdout': ''}
+
+        stdout = io.StringIO()
+        try:
+            with self.lock, contextlib.redirect_stdout(output if output is not None else stdout):
+                provider = self.provider(message['account'], message['vendor'])
+                if op == 'attr':
+                    value = getattr(provider, message['name'])
+                    result = LOCAL if callable(value) or not picklable(value) else value
+                elif op == 'call':
+                    method = message['method']
+                    if method not in REMOTE_METHODS and method not in CONFIRMED_METHODS:
+                        raise Exception(f'Method {method} is not served by skywayd.')
+                    if method in CONFIRMED_METHODS and message['kwargs'].get('need_confirmation', True):
+                        raise Exception(f'Method {method} needs a confirmation from the terminal.')
+                    result = getattr(provider, method)(*message['args'], **message['kwargs'])
+                else:
+                    raise Exception(f'Unknown request {op}.')
+            # list_nodes returns the table as a StringIO
+            if isinstance(result, tuple):
+                result = tuple(r.getvalue() if isinstance(r, io.StringIO) else r for r in result)
+            pickle.dumps(result)
+        except Exception as e:
+            return {'error': remote_error(e), 'stdout': stdout.getvalue()}
+        return {'result': result, 'stdout': stdout.getvalue()}
+
+    def serve(self):
+        import socketserver
+
+        daemon = self
+        path = socket_path()
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                # only the owner of the daemon may talk to it (the run folder is also 700)
+                if hasattr(socket, 'SO_PEERCRED'):
+                    creds = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+                    pid, uid, gid = struct.unpack('3i', creds)
+                    if uid != os.getuid():
+                        return
+                message = recv_message(self.request)
+                if message is None:
+                    return
+                daemon.last_request = time.time()
+                if message.get('op') == 'stop':
+                    send_message(self.request, {'result': 'stopping', 'stdout': ''})
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                    return
+                send_message(self.request, daemon.handle(message, OutputStream(self.request)))
+                daemon.last_request = time.time()
+
+        if os.path.exists(path):
+            try:
+                request({'op': 'ping'}, timeout=2.0)
+                raise Exception(f'skywayd is already running on {path}.')
+            except (OSError, socket.timeout):
+                # left over from a daemon that did not exit cleanly
+                os.unlink(path)
+
+        old_umask = os.umask(0o177)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        finally:
+            os.umask(old_umask)
+        server.daemon_threads = True
+
+        def watch_idle():
+            while True:
+                time.sleep(min(60, max(1, self.idle_timeout / 10)))
+                if time.time() - self.last_request > self.idle_timeout:
+                    server.shutdown()
+                    return
+
+        if self.idle_timeout > 0:
+            threading.Thread(target=watch_idle, daemon=True).start()
+
+        if debug:
+            print(f"skywayd listening on {path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(path):
+                os.unlink(path)
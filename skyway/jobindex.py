@@ -0,0 +1,155 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Local index of the jobs (nodes) a user has created with an account, kept under $SKYWAYROOT/var/jobs/<user>/<account>.json
+so that connecting to a job, running a script on it or copying files to it finds its instance ID and host
+without listing the account. create_nodes adds the nodes, destroy_nodes removes them, and an entry is checked
+against the cloud API again once it is older than the TTL or past the walltime of the job.
+"""
+
+import json
+import os
+import time
+
+from . import cfg, utils
+
+# seconds an entry is trusted without asking the cloud API, overridden by job_index_ttl in the account
+DEFAULT_TTL = 3600
+
+def walltime_seconds(walltime):
+    '''
+    seconds in a walltime [days-]hours:minutes:seconds, None if the walltime is not given
+    '''
+    if walltime is None or walltime == "":
+        return None
+    days, _, clock = str(walltime).rpartition('-')
+    seconds = 0
+    for field in clock.split(':'):
+        seconds = seconds * 60 + int(field)
+    return seconds + int(days or 0) * 86400
+
+class JobIndex():
+    '''
+    entries of the jobs of the current user under an account: job name -> list of
+    {id, host, instance_type, launch_time, expires, verified}, one per node of the job
+    '''
+    def __init__(self, account_name: str, user_name=None, ttl=DEFAULT_TTL):
+        if user_name is None:
+            user_name = os.environ.get('USER', str(os.getuid()))
+        self.path = os.path.join(cfg['paths']['var'], 'jobs', user_name, f'{account_name}.json')
+        self.ttl = ttl
+        self.jobs = None
+        self.key = None
+
+    def _read(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.jobs, self.key = {}, None
+            return self.jobs
+        # read again only when another command has changed the file
+        key = (st.st_size, st.st_mtime_ns)
+        if self.jobs is None or key != self.key:
+            try:
+                with open(self.path, 'r') as f:
+                    self.jobs = json.load(f)
+                self.key = key
+            except (OSError, ValueError):
+                self.jobs, self.key = {}, None
+        return self.jobs
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            utils.write_private(self.path, json.dumps(self.jobs, indent=1).encode())
+        except OSError:
+            # no writable var folder: the lookups go to the cloud API as before
+            return
+        st = os.stat(self.path)
+        self.key = (st.st_size, st.st_mtime_ns)
+
+    def valid(self, entry, now=None):
+        if now is None:
+            now = time.time()
+        if entry['expires'] is not None and now >= entry['expires']:
+            return False
+        return now - entry['verified'] < self.ttl
+
+    def get(self, name):
+        '''
+        the entry of a job name (its first node) if it can be trusted, None otherwise
+        '''
+        entries = self._read().get(name)
+        if not entries or not self.valid(entries[0]):
+            return None
+        return entries[0]
+
+    def find(self, instance_id):
+        '''
+        the job name and entry of an instance ID if it can be trusted, (None, None) otherwise
+        '''
+        for name, entries in self._read().items():
+            for entry in entries:
+                if entry['id'] == instance_id:
+                    return (name, entry) if self.valid(entry) else (None, None)
+        return None, None
+
+    def add(self, name, instance_id, host, instance_type, launch_time=None, walltime=None):
+        '''
+        add (or refresh) a node of a job, the entry expires after the walltime from its launch time
+        '''
+        jobs = self._read()
+        now = time.time()
+        seconds = walltime_seconds(walltime)
+        launch = utils.parse_iso(launch_time)
+        start = launch.timestamp() if launch is not None else now
+        entry = {
+            'id': str(instance_id),
+            'host': host,
+            'instance_type': instance_type,
+            'launch_time': launch.isoformat() if launch is not None else None,
+            'expires': start + seconds if seconds is not None else None,
+            'verified': now,
+        }
+        entries = [e for e in jobs.get(name, []) if e['id'] != entry['id']]
+        if walltime is None:
+            # a refresh from a lookup keeps the walltime given at creation, unless the node has outlived it
+            previous = next((e for e in jobs.get(name, []) if e['id'] == entry['id']), None)
+            if previous is not None and previous['expires'] is not None and previous['expires'] > now:
+                entry['expires'] = previous['expires']
+        jobs[name] = entries + [entry]
+        self._write()
+
+    def remove(self, names=None, ids=None):
+        '''
+        drop the entries of the given job names or instance IDs
+        '''
+        jobs = self._read()
+        if len(jobs) == 0:
+            return
+        names = set(names or [])
+        ids = set(str(i) for i in (ids or []))
+        changed = False
+        for name in list(jobs):
+            entries = [] if name in names else [e for e in jobs[name] if e['id'] not in ids]
+            if len(entries) != len(jobs[name]):
+                changed = True
+                if entries:
+                    jobs[name] = entries
+                else:
+                    del jobs[name]
+        if changed:
+            self._write()
+
+    def sync(self, running_ids):
+        '''
+        keep only the entries whose instance is among the IDs of a complete listing of the running instances
+        '''
+        jobs = self._read()
+        running_ids = set(str(i) for i in running_ids)
+        stale = [e['id'] for entries in jobs.values() for e in entries if e['id'] not in running_ids]
+        if stale:
+            self.remove(ids=stale)
@@ -0,0 +1,96 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Slowly changing catalogs of a cloud account (locations, VM sizes, subnetworks, availability domains, images),
+kept per account and region under $SKYWAYROOT/run/<user>/metadata so that creating a node
+does not list them again from the cloud API.
+"""
+
+import io
+import pickle
+import time
+
+from . import utils
+
+# seconds before a catalog is fetched again, overridden by metadata_ttl in the account or in cloud.yaml
+DEFAULT_TTL = 86400
+
+class MetadataCache():
+    '''
+    catalogs of an account in a region by kind (e.g. "locations", "sizes:eastus"), each stored with the time it was fetched;
+    references to the libcloud driver are not stored, but re-attached to the driver of the provider when loaded
+    '''
+    def __init__(self, account_name: str, region="", ttl=DEFAULT_TTL, driver=None):
+        name = account_name if region == "" else account_name + '-' + region.replace(' ', '').lower()
+        try:
+            self.path = utils.run_path('metadata', f'{name}.pkl')
+        except OSError:
+            # no writable runtime folder, fetch the catalogs every time
+            self.path = None
+        self.ttl = ttl
+        self.driver = driver
+        self.entries = None
+
+    def _read(self):
+        if self.entries is None:
+            driver = self.driver
+
+            class Unpickler(pickle.Unpickler):
+                def persistent_load(self, pid):
+                    return driver
+
+            if self.path is None:
+                self.entries = {}
+                return self.entries
+            try:
+                with open(self.path, 'rb') as f:
+                    self.entries = Unpickler(f).load()
+            except Exception:
+                # missing, or written by another version of the cloud SDK
+                self.entries = {}
+        return self.entries
+
+    def _write(self):
+        if self.path is None:
+            return
+        driver = self.driver
+
+        class Pickler(pickle.Pickler):
+            def persistent_id(self, obj):
+                return 'driver' if driver is not None and obj is driver else None
+
+        data = io.BytesIO()
+        Pickler(data, protocol=pickle.HIGHEST_PROTOCOL).dump(self.entries)
+        try:
+            utils.write_private(self.path, data.getvalue())
+        except OSError:
+            # the catalogs stay in this process only
+            pass
+
+    def get(self, kind: str, fetch, refresh=False):
+        '''
+        return the catalog of the given kind, fetch() lists it from the cloud API when it is missing,
+        older than the TTL or when refresh is True
+        '''
+        entry = self._read().get(kind)
+        if not refresh and entry is not None and time.time() - entry['fetched'] < self.ttl:
+            return entry['value']
+
+        value = fetch()
+        self.entries[kind] = {'value': value, 'fetched': time.time()}
+        self._write()
+        return value
+
+    def refresh(self, kind=None):
+        '''
+        drop one catalog, or all of them, so that they are fetched again on next use
+        '''
+        entries = self._read()
+        if kind is None:
+            entries.clear()
+        else:
+            entries.pop(kind, None)
+        self._write()
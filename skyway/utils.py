@@ -3,17 +3,106 @@
 
 # Maintainer: Yuxing Peng, Trung Nguyen
 
+from datetime import datetime, timezone
 import os
+import pickle
+import re
 import yaml
 from subprocess import PIPE, Popen
 
+# the C loader (libyaml) is much faster than the pure-Python loader, fall back if PyYAML is built without it
+YamlLoader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
+# compiled configurations of this process: file path -> ((size, mtime), pickled content)
+_compiled = {}
+
+# return a path under the runtime folder of the current user ($SKYWAYROOT/run/<user>),
+# the folders are created with permission 700 as they may hold account secrets
+def run_path(*names):
+    user = os.environ.get('USER', str(os.getuid()))
+    user_path = os.path.join(os.environ['SKYWAYROOT'], 'run', user)
+    if not os.path.isdir(user_path):
+        os.makedirs(user_path, exist_ok=True)
+        os.chmod(user_path, 0o700)
+    path = os.path.join(user_path, *names[:-1])
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return os.path.join(path, names[-1])
+
+# write a file atomically (readable only by the owner) so that concurrent commands never see a partial file
+def write_private(file_name, data: bytes):
+    tmp_file = f"{file_name}.{os.getpid()}.tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_file, file_name)
+
+# load a YAML file through a compiled (pickled) copy under $SKYWAYROOT/run/<user>/config,
+# the copy is keyed by the path, size and modification time of the file and rebuilt only when the file changes
+def load_yaml(cfg_file):
+    cfg_file = os.path.abspath(cfg_file)
+    st = os.stat(cfg_file)
+    key = (st.st_size, st.st_mtime_ns)
+
+    if cfg_file in _compiled and _compiled[cfg_file][0] == key:
+        return pickle.loads(_compiled[cfg_file][1])
+
+    blob = None
+    try:
+        cache_file = run_path('config', cfg_file.strip('/').replace('/', '%') + '.pkl')
+    except OSError:
+        # no writable runtime folder, parse the file every time
+        cache_file = None
+
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                path, cached_key, cached_blob = pickle.load(f)
+            if path == cfg_file and cached_key == key:
+                blob = cached_blob
+        except Exception:
+            # stale or corrupted copy, rebuild it below
+            blob = None
+
+    if blob is None:
+        with open(cfg_file, 'r') as f:
+            blob = pickle.dumps(yaml.load(f, Loader=YamlLoader), protocol=pickle.HIGHEST_PROTOCOL)
+        if cache_file is not None:
+            try:
+                write_private(cache_file, pickle.dumps((cfg_file, key, blob), protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError:
+                pass
+
+    _compiled[cfg_file] = (key, blob)
+    return pickle.loads(blob)
+
 def load_config(cfg_name, cfg_path):
     cfg_file = cfg_path + cfg_name + '.yaml'
     if not os.path.isfile(cfg_file):
         raise Exception(f'Configuration file {cfg_file} cannot be found.')
 
-    with open(cfg_file, 'r') as f:
-        return yaml.load(f.read(), Loader=yaml.FullLoader)
+    return load_yaml(cfg_file)
+
+# fractions of a second with other than 6 digits (Azure writes 7) and a trailing Z, which older datetime.fromisoformat rejects
+_iso_fraction = re.compile(r'\.(\d+)')
+
+# parse an ISO 8601 time stamp of a cloud API (e.g. 2024-05-01T10:00:00.1234567+00:00) into a datetime in UTC,
+# datetime.fromisoformat is several times faster than strptime; None or "" gives None
+def parse_iso(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        t = value
+    else:
+        try:
+            t = datetime.fromisoformat(value)
+        except ValueError:
+            value = _iso_fraction.sub(lambda m: '.' + m.group(1)[:6].ljust(6, '0'), value)
+            if value.endswith('Z'):
+                value = value[:-1] + '+00:00'
+            t = datetime.fromisoformat(value)
+    if t.tzinfo is None:
+        return t.replace(tzinfo=timezone.utc)
+    return t
 
 # execute a command, return output as a list of rows, each row is converted to a list of words
 def proc(command, strict=True):
@@ -45,6 +134,12 @@ def script2cmd(script_name: str):
             cmd += l + "; "
     return cmd
 
+# ssh/scp options sharing one connection per host (OpenSSH ControlMaster),
+# the control sockets are kept under $SKYWAYROOT/run/<user>/ssh for [persist] seconds after the last use
+def ssh_mux_opts(persist=600):
+    control_path = run_path('ssh', '%C')
+    return f"-o ControlMaster=auto -o ControlPath={control_path} -o ControlPersist={persist}"
+
 # get the username of a uid
 def get_username(uid):
     uid = proc("getent passwd " + uid + " | awk -F: '{print $1}'")
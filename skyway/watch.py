@@ -0,0 +1,81 @@
+# Copyright (c) 2019-2024 The University of Chicago.
+# Part of skyway, released under the BSD 3-Clause License.
+
+# Maintainer: Yuxing Peng, Trung Nguyen
+
+"""@package docstring
+Change feed of the nodes of an account: the account is listed again and again, and only the nodes
+added, removed or changed (state or host) since the previous listing are reported. The listings are
+taken every few seconds while a node is between two states (e.g. pending, stopping, PD) and further and
+further apart (up to max_interval) while nothing changes.
+"""
+
+import time
+from datetime import datetime, timezone
+
+# states in which a node is expected to change soon (lower case), over all the vendors:
+# boto3 and libcloud, OCI lifecycle states and the compact SLURM job states
+TRANSIENT_STATES = {
+    'pending', 'starting', 'stopping', 'shutting-down', 'rebooting', 'migrating',
+    'provisioning', 'staging', 'suspending', 'terminating', 'moving', 'creating_image',
+    'pd', 'cf', 'cg',
+}
+
+class NodeChange():
+    '''
+    a node added, removed or changed between two listings: kind is "added", "removed" or "changed",
+    record the NodeRecord of the node (the last one seen for a removed node) and previous the one before the change
+    '''
+    __slots__ = ('kind', 'record', 'previous', 'time')
+
+    # columns of row()
+    headers = ['Time', 'Change', 'Name', 'User', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']
+
+    def __init__(self, kind, record, previous=None):
+        self.kind = kind
+        self.record = record
+        self.previous = previous
+        self.time = datetime.now(timezone.utc)
+
+    def row(self):
+        return [self.time.strftime('%Y-%m-%dT%H:%M:%SZ'), self.kind] + self.record.row(self.time)
+
+def diff(previous, current):
+    '''
+    the NodeChanges from one listing to the next, each a dict instance ID -> NodeRecord
+    '''
+    changes = []
+    for node_id, record in current.items():
+        before = previous.get(node_id)
+        if before is None:
+            changes.append(NodeChange('added', record))
+        elif before.state != record.state or before.host != record.host:
+            changes.append(NodeChange('changed', record, before))
+    for node_id, record in previous.items():
+        if node_id not in current:
+            changes.append(NodeChange('removed', record, record))
+    return changes
+
+def is_transient(state):
+    return str(state).lower() in TRANSIENT_STATES
+
+def changes(provider, min_interval=5.0, max_interval=60.0, show_protected_nodes=False, sleep=time.sleep):
+    '''
+    yield the NodeChanges of the nodes of an account (a provider object) for ever, the first listing reports
+    all the nodes as added; the next listing is taken min_interval seconds after a change or while a node is
+    in a transient state, otherwise the interval doubles up to max_interval
+    '''
+    previous = {}
+    interval = min_interval
+    while True:
+        current = {record.id: record for record in provider.node_table(show_protected_nodes)}
+        found = diff(previous, current)
+        for change in found:
+            yield change
+        previous = current
+
+        if found or any(is_transient(record.state) for record in current.values()):
+            interval = min_interval
+        else:
+            interval = min(interval * 2, max_interval)
+        sleep(interval)
@@ -8,10 +8,8 @@
 # export SKYWAYROOT=/project/rcc/trung/skyway-github
 
 import skyway
-from skyway.cloud.aws import *
-from skyway.cloud.gcp import *
-from skyway.cloud.azure import *
-from skyway.cloud.slurm import *
+from skyway import cloud
+from skyway.cloud.core import NodeRecord
 
 import os
 import subprocess
@@ -21,9 +19,41 @@ from io import StringIO
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 
-import pandas as pd
+import threading
 #import nest_asyncio
 
+# Streamlit reruns this script on every interaction and every autorefresh of every open tab:
+# the provider objects and the node types are kept for the whole server process, and the listings
+# for 30 seconds; an action on an account bumps its generation so that only its listing is fetched again
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_provider(account_name: str, vendor_name: str):
+    return cloud.create(account_name, vendor_name)
+
+@st.cache_resource(show_spinner=False)
+def get_lock(account_name: str):
+    # the provider objects (boto3 resources, libcloud drivers) are shared by the sessions but not thread-safe
+    return threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def get_generations():
+    return {}
+
+def invalidate(account_name: str):
+    generations = get_generations()
+    generations[account_name] = generations.get(account_name, 0) + 1
+
+@st.cache_data(ttl=30, show_spinner=False)
+def node_table(account_name: str, vendor_name: str, generation: int):
+    with get_lock(account_name):
+        return get_provider(account_name, vendor_name).node_table()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_balance(account_name: str, vendor_name: str, user_name: str, generation: int):
+    with get_lock(account_name):
+        accumulating_cost, remaining_balance = get_provider(account_name, vendor_name).get_cost_and_usage_from_db(user_name=user_name)
+    return remaining_balance
+
 class InstanceDescriptor:
     def __init__(self, jobname: str, account_name: str, node_type: str, walltime: str, vendor_name: str):
         self.jobname = jobname
@@ -32,15 +62,8 @@ class InstanceDescriptor:
         self.walltime = walltime
         self.vendor_name = vendor_name
 
-        self.account = None
-        if 'aws' in vendor_name:
-            self.account = AWS(account_name)
-        elif 'gcp' in vendor_name:
-            self.account = GCP(account_name)
-        elif 'azure' in vendor_name:
-            self.account = AZURE(account_name)
-        elif 'midway3' in vendor_name:
-            self.account = SLURMCluster(account_name)
+        # the provider object of the account shared by all the reruns and sessions
+        self.account = get_provider(account_name, vendor_name)
 
         self.user = os.environ['USER']
 
@@ -49,7 +72,9 @@ class InstanceDescriptor:
         #if st.button("Yes"):
         
         print(f"creating node from {self.vendor_name} with account {self.account_name}")
-        self.account.create_nodes(self.node_type, [self.jobname], need_confirmation=False, walltime=self.walltime)
+        with get_lock(self.account_name):
+            self.account.create_nodes(self.node_type, [self.jobname], need_confirmation=False, walltime=self.walltime)
+        invalidate(self.account_name)
         initializing = True
         return initializing
 
@@ -70,18 +95,22 @@ class InstanceDescriptor:
             instanceID = self.account.get_instance_ID(self.jobname)
             self.account.connect_node(instanceID)
 
+        invalidate(self.account_name)
+
     def terminateJob(self, node_names = []):
         st.write(f"Terminating instances {node_names}...")
-        if "midway3" in self.vendor_name:
-            instanceID = self.account.get_instance_ID(self.jobname)
-            self.account.destroy_nodes(IDs=[instanceID], need_confirmation=False)
-        else:
-            self.account.destroy_nodes(node_names=node_names, need_confirmation=False)
+        with get_lock(self.account_name):
+            if "midway3" in self.vendor_name:
+                instanceID = self.account.get_instance_ID(self.jobname)
+                self.account.destroy_nodes(IDs=[instanceID], need_confirmation=False)
+            else:
+                self.account.destroy_nodes(node_names=node_names, need_confirmation=False)
+        invalidate(self.account_name)
 
     def getBalance(self):
         # retrieve from database for the given account
-        accumulating_cost, remaining_balance = self.account.get_cost_and_usage_from_db(user_name=self.user)
-        return remaining_balance
+        generation = get_generations().get(self.account_name, 0)
+        return get_balance(self.account_name, self.vendor_name, self.user, generation)
 
     def getEstimateCost(self):
         pt = datetime.strptime(self.walltime, "%H:%M:%S")
@@ -93,10 +122,25 @@ class InstanceDescriptor:
         cost = walltime_in_hours * unit_price
         return cost
   
-    def list_nodes(self):
-        nodes, list_of_nodes = self.account.list_nodes(verbose=False) 
-        return nodes
-
+    def node_table(self):
+        generation = get_generations().get(self.account_name, 0)
+        return node_table(self.account_name, self.vendor_name, generation)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def node_type_labels(vendor_short):
+    '''
+    describe the node types of a vendor for the select box, e.g. "g1 (p3.2xlarge, 4-core CPU, 1 v100 GPU)"
+    '''
+    labels = []
+    for node_type in cloud.load_catalog(vendor_short):
+        desc = f"{node_type.cores}-core CPU"
+        if node_type.gpu:
+            desc += f", {node_type.gpu} {node_type.gpu_type} GPU"
+        elif node_type.memgb is not None:
+            desc += f" + {node_type.memgb} GB RAM"
+        labels.append(f"{node_type.alias} ({node_type.name}, {desc})")
+    return tuple(labels)
 
 if __name__ == "__main__":
 
@@ -127,22 +171,21 @@ if __name__ == "__main__":
         # populate this select box depending on the allocation (account.yaml)
         vendor_name = vendor.lower()
         if 'aws' in vendor_name:
-            node_types = ('t1 (t2.micro, 1-core CPU)', 'c1 (c5.large, 1-core CPU)', 'c36 (c5.18xlarge, 36-core CPU)', 'g1 (p3.2xlarge, 1 V100 GPU)')
             vendor_short = "aws"
             accounts = ('rcc-aws', 'ndtrung-aws')
         elif 'gcp' in vendor_name:
-            node_types = ('t1 (n1-standard-1, 1-core CPU)', 'c1 (n1-standard-2, 1-core CPU, 2 hardware threads)', 'c4 (c2-standard-8, 4-core CPU)', 'g1 (n1-standard-8, 4-core CPU)')
             vendor_short = "gcp"
             accounts = ('rcc-gcp', 'ndtrung-gcp')
         elif 'azure' in vendor_name:
-            node_types = ('c1 (Standard_DS1_v2, 1-core CPU)', 'b4 (Standard_B2ts_v2, 2-core CPU)', 'b32 (Standard_B32ls_v2, 32-core)', 'g1 (Standard_NC6s_A100_v3, 1 A100 GPU)')
             vendor_short = "azure"
             accounts = ('rcc-azure', 'ndtrung-azure')
         elif 'midway3' in vendor_name:
-            node_types = ('t1 (1 CPU core + 4 GB RAM)', 'c4 (4 CPU cores + 16 GB RAM)', 'c16 (16 CPU cores + 64 GB RAM)', 'c48 (48 CPU cores + 128 GB RAM)', 'g1 (8 CPU cores + 1 V100 GPU)', 'bigmem (16 CPU cores + 512 GB RAM)')
             accounts = ('rcc-midway3',)
             vendor_short = "midway3"
 
+        # the node types of the vendor as listed in cloud.yaml
+        node_types = node_type_labels(vendor_short)
+
         # account or allocation
         #allocation = st.text_input(r"$\textsf{\large Account}$", "rcc-aws", key='account', help='Your cloud account (e.g. rcc-aws) or on-premises allocation (e.g. rcc-staff)')
         allocation = st.selectbox(r"$\textsf{\large Account}$", accounts, key='account', help='Your cloud account (e.g. rcc-aws) or on-premises allocation (e.g. rcc-staff)')
@@ -202,12 +245,10 @@ if __name__ == "__main__":
             jobs.write("Node initializing..")
 
         st.markdown("#### Running nodes")
-        headers=['Name', 'Status', 'Type', 'Instance ID', 'Host', 'Elapsed Time', 'Running Cost']
-
-        # listing all the running nodes/instances
-        nodes = instanceDescriptor.list_nodes()
-
-        df = pd.DataFrame(nodes, columns=headers)
+        # listing all the running nodes/instances, the columns of the table are those of skyway_list
+        columns = ['name', 'user', 'state', 'instance_type', 'id', 'host', 'elapsed_time', 'running_cost']
+        df = instanceDescriptor.node_table().to_pandas()[columns]
+        df.columns = NodeRecord.headers
         df.style.hide(axis="index")
         st.table(df)
 
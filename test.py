@@ -12,14 +12,8 @@ from datetime import datetime, timezone
 import skyway
 from skyway import account
 
-#from skyway.cloud import aws
-#from skyway.cloud import gcp
-from skyway.cloud.aws import *
-from skyway.cloud.gcp import *
-from skyway.cloud.azure import *
-from skyway.cloud.slurm import *
-from skyway.cloud.oci import *
-from datetime import datetime, timezone
+from skyway import cloud
+import os
 
 import tabulate
 
@@ -33,12 +27,12 @@ import tabulate
 #account.show("ndtrung-azure")
 
 # Test cloud nodes
-account = AWS('rcc-aws')
-#account = GCP('rcc-gcp')
-#account = GCP('ndtrung-gcp')
-#account = AZURE('rcc-azure')
-#account = OCI('ndtrung-oci')
-#account = SLURMCluster('rcc-slurm')
+account = cloud.create('rcc-aws', 'aws')
+#account = cloud.create('rcc-gcp', 'gcp')
+#account = cloud.create('ndtrung-gcp', 'gcp')
+#account = cloud.create('rcc-azure', 'azure')
+#account = cloud.create('ndtrung-oci', 'oci')
+#account = cloud.create('rcc-slurm', 'slurm')
 
 # list all the node types available
 account.get_node_types()